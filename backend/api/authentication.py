@@ -0,0 +1,67 @@
+"""Token authentication with the token to user lookup cached.
+
+Resolved tokens are kept in a per-process LRU (the ``tokens`` cache,
+TOKEN_LOCAL_CACHE_TIMEOUT) in front of the shared default cache
+(TOKEN_CACHE_TIMEOUT), so most requests authenticate without a query.
+Signals drop both tiers of this process and the shared tier when a
+token is deleted (logout) or its user changes, e.g. is deactivated;
+other processes follow within TOKEN_LOCAL_CACHE_TIMEOUT. That needs a
+default cache shared by all processes: with a per-process one
+TOKEN_CACHE_TIMEOUT defaults to 0, which turns both tiers off, and the
+api.E001 check refuses to start if it is set anyway.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+CACHE_PREFIX = 'auth_token'
+LOCAL_CACHE = 'tokens'
+
+
+def get_cache_key(key):
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return f'{CACHE_PREFIX}:{digest}'
+
+
+def invalidate_token_keys(keys):
+    """Drop cached users of the given token keys on commit."""
+    cache_keys = [get_cache_key(key) for key in keys]
+    if not cache_keys:
+        return
+
+    def delete():
+        caches[LOCAL_CACHE].delete_many(cache_keys)
+        cache.delete_many(cache_keys)
+
+    transaction.on_commit(delete)
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_token_keys(
+        Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that caches the resolved user and token."""
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+        cache_key = get_cache_key(key)
+        local_cache = caches[LOCAL_CACHE]
+        credentials = local_cache.get(cache_key)
+        if credentials is not None:
+            return credentials
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(cache_key, credentials, settings.TOKEN_CACHE_TIMEOUT)
+        local_cache.set(
+            cache_key, credentials, settings.TOKEN_LOCAL_CACHE_TIMEOUT
+        )
+        return credentials
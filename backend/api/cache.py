@@ -0,0 +1,200 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+from backend.metrics import render_response, set_cache_result
+
+CACHE_PREFIX = 'recipe_response'
+PAYLOAD_CACHE_PREFIX = 'recipe_payload'
+ALL_VERSION = 'all'
+LIST_VERSION = 'list'
+ORDERED_LIST_VERSION = 'ordered_list'
+
+
+def get_version_key(name):
+    return f'{CACHE_PREFIX}_version:{name}'
+
+
+def get_version_map(names):
+    keys = {name: get_version_key(name) for name in names}
+    versions = cache.get_many(keys.values())
+    missing = {key: 1 for key in keys.values() if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {name: versions[key] for name, key in keys.items()}
+
+
+def get_versions(*names):
+    versions = get_version_map(names)
+    return '.'.join(str(versions[name]) for name in names)
+
+
+def get_payload_keys(recipe_ids, host):
+    """Cache keys of user-independent recipe payloads, by recipe id."""
+    versions = get_version_map([ALL_VERSION, *map(str, recipe_ids)])
+    return {
+        recipe_id: (
+            f'{PAYLOAD_CACHE_PREFIX}:{versions[ALL_VERSION]}.'
+            f'{versions[str(recipe_id)]}:{host}:{recipe_id}'
+        )
+        for recipe_id in recipe_ids
+    }
+
+
+def get_recipe_payloads(instances, host, render):
+    """User-independent payloads of recipes, in the order given.
+
+    ``render`` builds payloads for a list of recipes; with
+    RECIPE_PAYLOAD_CACHE_TIMEOUT set it is only called for cache misses.
+    """
+    timeout = settings.RECIPE_PAYLOAD_CACHE_TIMEOUT
+    if not timeout:
+        return render(instances)
+    keys = get_payload_keys([instance.id for instance in instances], host)
+    payloads = cache.get_many(keys.values())
+    missing = [
+        instance for instance in instances
+        if keys[instance.id] not in payloads
+    ]
+    if missing:
+        rendered = {
+            keys[instance.id]: payload
+            for instance, payload in zip(missing, render(missing))
+        }
+        cache.set_many(rendered, timeout)
+        payloads.update(rendered)
+    return [payloads[keys[instance.id]] for instance in instances]
+
+
+def bump_versions(*names):
+    for name in names:
+        key = get_version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def invalidate_recipes(recipe_ids):
+    """Drop cached lists and the details of the given recipes on commit."""
+    names = [LIST_VERSION, *map(str, recipe_ids)]
+    transaction.on_commit(lambda: bump_versions(*names))
+
+
+def invalidate_all_recipes():
+    transaction.on_commit(lambda: bump_versions(ALL_VERSION))
+
+
+def invalidate_ordered_lists():
+    """Drop cached lists with an explicit `ordering` on commit."""
+    transaction.on_commit(lambda: bump_versions(ORDERED_LIST_VERSION))
+
+
+def make_etag(content):
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return etag in [value.strip() for value in if_none_match.split(',')]
+
+
+class AnonymousResponseCacheMixin:
+    """Cache rendered list/retrieve responses for anonymous users.
+
+    Keys are built from the normalized query string and per-recipe
+    version counters, which signals bump when a recipe changes. Lists
+    with an `ordering` also follow the counters they are ordered by.
+    Responses carry an ETag and honour If-None-Match.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def get_response_cache_key(self, request):
+        params = urlencode(sorted(
+            (key, value)
+            for key in request.query_params
+            for value in sorted(request.query_params.getlist(key))
+        ))
+        if self.action == 'retrieve':
+            versions = get_versions(ALL_VERSION, str(self.kwargs['pk']))
+        elif 'ordering' in request.query_params:
+            # Lists are ordered by counters, which change without a write
+            # to the recipes themselves.
+            versions = get_versions(
+                ALL_VERSION, LIST_VERSION, ORDERED_LIST_VERSION
+            )
+        else:
+            versions = get_versions(ALL_VERSION, LIST_VERSION)
+        signature = (
+            f'{self.action}:{self.kwargs.get("pk", "")}:'
+            f'{request.get_host()}:{request.accepted_renderer.format}:'
+            f'{params}'
+        )
+        return (
+            f'{CACHE_PREFIX}:{versions}:'
+            f'{hashlib.sha256(signature.encode("utf-8")).hexdigest()}'
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        self.response_cache_key = None
+        if (not settings.RECIPE_RESPONSE_CACHE_TIMEOUT
+                or request.user.is_authenticated
+                or self.action not in self.cached_actions):
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            set_cache_result('miss')
+            self.response_cache_key = key
+            return handler(request, *args, **kwargs)
+        set_cache_result('hit')
+        if etag_matches(request, entry['etag']):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                entry['content'],
+                content_type=entry['content_type'],
+            )
+        response['ETag'] = entry['etag']
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        key = getattr(self, 'response_cache_key', None)
+        if (key is None
+                or not isinstance(response, Response)
+                or response.status_code != 200):
+            return response
+        render_response(response)
+        etag = make_etag(response.content)
+        cache.set(
+            key,
+            {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': etag,
+            },
+            settings.RECIPE_RESPONSE_CACHE_TIMEOUT,
+        )
+        response['ETag'] = etag
+        if etag_matches(request, etag):
+            not_modified = HttpResponseNotModified()
+            not_modified['ETag'] = etag
+            return not_modified
+        return response
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_token_cache(app_configs, **kwargs):
+    """Refuse the shared token tier on a cache that is not shared."""
+    if (settings.TOKEN_CACHE_TIMEOUT
+            and settings.CACHES['default']['BACKEND']
+            in settings.PROCESS_LOCAL_CACHES):
+        return [Error(
+            'TOKEN_CACHE_TIMEOUT is set with a per-process cache backend.',
+            hint=(
+                'Other workers would accept a revoked token until it '
+                'expires in their cache. Set CACHE_BACKEND to a shared '
+                'cache or TOKEN_CACHE_TIMEOUT to 0.'
+            ),
+            id='api.E001',
+        )]
+    return []
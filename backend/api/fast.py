@@ -0,0 +1,205 @@
+"""Read-only serializers for the hot GET endpoints.
+
+They build plain dicts instead of binding DRF fields per object and must
+render to the same JSON as their counterparts in api.serializers: same
+keys in the same order and same value types. Views switch to them with
+the FAST_READ_SERIALIZERS setting.
+"""
+from django.db.models import Manager, prefetch_related_objects
+
+from api.cache import get_recipe_payloads
+from api.membership import get_membership
+from api.serializers import RecipeViewSerializer
+
+
+def image_url(image, request=None):
+    """Same value as DRF's ImageField with use_url enabled."""
+    if not image:
+        return None
+    try:
+        url = image.url
+    except AttributeError:
+        return None
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def tag_to_dict(tag):
+    return {
+        'id': tag.id,
+        'name': tag.name,
+        'color': tag.color,
+        'slug': tag.slug,
+    }
+
+
+def ingredient_to_dict(ingredient):
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'measurement_unit': ingredient.measurement_unit,
+    }
+
+
+def recipe_ingredient_to_dict(recipe_ingredient):
+    ingredient = recipe_ingredient.ingredient
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'measurement_unit': ingredient.measurement_unit,
+        'amount': recipe_ingredient.amount,
+    }
+
+
+def user_to_dict(user, membership=None):
+    return {
+        'email': user.email,
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_subscribed': (
+            membership is not None and membership.is_subscribed(user.id)
+        ),
+    }
+
+
+def short_recipe_to_dict(recipe, request=None):
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'image': image_url(recipe.image, request),
+        'image_card': image_url(recipe.image_card, request),
+        'image_thumbnail': image_url(recipe.image_thumbnail, request),
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def recipe_to_dict(recipe, request=None, membership=None):
+    return {
+        'id': recipe.id,
+        'tags': [tag_to_dict(tag) for tag in recipe.tags.all()],
+        'author': user_to_dict(recipe.author, membership),
+        'ingredients': [
+            recipe_ingredient_to_dict(recipe_ingredient)
+            for recipe_ingredient in recipe.ingredients.all()
+        ],
+        'is_favorited': (
+            membership is not None and membership.is_favorited(recipe.id)
+        ),
+        'is_in_shopping_cart': (
+            membership is not None
+            and membership.is_in_shopping_cart(recipe.id)
+        ),
+        'name': recipe.name,
+        'image': image_url(recipe.image, request),
+        'image_card': image_url(recipe.image_card, request),
+        'image_thumbnail': image_url(recipe.image_thumbnail, request),
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def subscription_to_dict(user, request=None, membership=None):
+    data = user_to_dict(user, membership)
+    if hasattr(user, 'limited_recipes'):
+        recipes = user.limited_recipes
+    else:
+        recipes = user.recipes.all()
+        try:
+            recipes = recipes[:int(request.query_params.get('recipes_limit'))]
+        except Exception:
+            pass
+    data['recipes'] = [short_recipe_to_dict(recipe) for recipe in recipes]
+    data['recipes_count'] = (
+        user.recipes_count if hasattr(user, 'recipes_count')
+        else user.recipes.count()
+    )
+    return data
+
+
+class FastSerializer:
+    """Minimal read-only stand-in for a DRF serializer.
+
+    Supports what list and retrieve need: ``instance``, ``many``,
+    ``context`` and ``data``.
+    """
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def request(self):
+        return self.context.get('request')
+
+    @property
+    def data(self):
+        if not self.many:
+            return self.to_representation_many([self.instance])[0]
+        instances = self.instance
+        if isinstance(instances, Manager):
+            instances = instances.all()
+        return self.to_representation_many(list(instances))
+
+    def to_representation_many(self, instances):
+        return [self.to_representation(instance) for instance in instances]
+
+
+class FastTagSerializer(FastSerializer):
+    def to_representation(self, instance):
+        return tag_to_dict(instance)
+
+
+class FastIngredientSerializer(FastSerializer):
+    def to_representation(self, instance):
+        return ingredient_to_dict(instance)
+
+
+class FastShortRecipeSerializer(FastSerializer):
+    def to_representation(self, instance):
+        return short_recipe_to_dict(instance, self.request)
+
+
+class FastRecipeSerializer(FastSerializer):
+    """Counterpart of RecipeViewSerializer, sharing its payload cache."""
+
+    def to_representation_many(self, instances):
+        request = self.request
+        membership = get_membership(request)
+        data = get_recipe_payloads(
+            instances,
+            request.get_host() if request is not None else '',
+            self.render,
+        )
+        for instance, payload in zip(instances, data):
+            payload['is_favorited'] = (
+                membership is not None
+                and membership.is_favorited(instance.id)
+            )
+            payload['is_in_shopping_cart'] = (
+                membership is not None
+                and membership.is_in_shopping_cart(instance.id)
+            )
+            payload['author']['is_subscribed'] = (
+                membership is not None
+                and membership.is_subscribed(instance.author_id)
+            )
+        return data
+
+    def render(self, instances):
+        prefetch_related_objects(instances, *RecipeViewSerializer.prefetch)
+        return [
+            recipe_to_dict(instance, self.request) for instance in instances
+        ]
+
+
+class FastSubscriptionsSerializer(FastSerializer):
+    def to_representation_many(self, instances):
+        membership = get_membership(self.request)
+        return [
+            subscription_to_dict(instance, self.request, membership)
+            for instance in instances
+        ]
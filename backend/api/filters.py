@@ -0,0 +1,87 @@
+from django.db.models import Exists, OuterRef
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from recipes.models import Cart, Recipe
+
+TRUE_VALUES = ('1', 'true', 'True')
+ORDERINGS = {
+    '-favorites_count': ('-favorites_count', '-id'),
+}
+
+
+def favorited_by(user):
+    return Exists(
+        Recipe.favorite.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            user_id=user.id,
+        )
+    )
+
+
+def in_cart_of(user):
+    return Exists(
+        Cart.recipes.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            cart__user_id=user.id,
+        )
+    )
+
+
+def tagged_with(slugs):
+    return Exists(
+        Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag__slug__in=slugs,
+        )
+    )
+
+
+class RecipeFilterBackend(BaseFilterBackend):
+    """Combine `author`, `tags`, `is_favorited` and `is_in_shopping_cart`.
+
+    `ordering=-favorites_count` lists the most favorited recipes first.
+
+    Every filter narrows the same queryset, membership filters are EXISTS
+    subqueries, so no DISTINCT over recipe rows is needed.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        user = request.user
+
+        author_id = params.get('author')
+        if author_id is not None:
+            if not author_id.isdigit():
+                raise ValidationError(
+                    {'author': 'A valid integer is required.'}
+                )
+            queryset = queryset.filter(author_id=author_id)
+
+        tags = params.getlist('tags')
+        if tags:
+            queryset = queryset.annotate(
+                has_tags=tagged_with(tags)
+            ).filter(has_tags=True)
+
+        for param, expression in (
+                ('is_favorited', favorited_by),
+                ('is_in_shopping_cart', in_cart_of),
+        ):
+            if params.get(param) not in TRUE_VALUES:
+                continue
+            if not user.is_authenticated:
+                return queryset.none()
+            queryset = queryset.annotate(
+                **{param: expression(user)}
+            ).filter(**{param: True})
+
+        ordering = params.get('ordering')
+        if ordering is not None:
+            if ordering not in ORDERINGS:
+                raise ValidationError(
+                    {'ordering': f'Supported values: {", ".join(ORDERINGS)}.'}
+                )
+            queryset = queryset.order_by(*ORDERINGS[ordering])
+
+        return queryset
@@ -0,0 +1,156 @@
+"""Recipe photo processing.
+
+Uploads are decoded once with Pillow, stripped of metadata and capped to
+RECIPE_IMAGE_MAX_SIZE before they are stored. Card and thumbnail
+variants are rendered from the same decoded image by the background
+executor once the recipe is committed.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+from rest_framework import serializers
+
+from api.cache import invalidate_recipes
+from api.jobs import get_executor
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+}
+
+
+def get_variants():
+    """(field, file name suffix, max size) of each photo variant."""
+    return (
+        ('image_card', 'card', settings.RECIPE_IMAGE_CARD_SIZE),
+        ('image_thumbnail', 'thumbnail', settings.RECIPE_IMAGE_THUMBNAIL_SIZE),
+    )
+
+
+def get_variant_format():
+    image_format = settings.RECIPE_IMAGE_VARIANT_FORMAT.upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def flatten(image):
+    """RGB copy of the image, transparent areas on white."""
+    if image.mode == 'RGB':
+        return image
+    if not has_alpha(image):
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'PNG':
+        image.save(buffer, image_format, optimize=True)
+    else:
+        if image_format == 'JPEG':
+            image = flatten(image)
+        image.save(
+            buffer,
+            image_format,
+            quality=settings.RECIPE_IMAGE_QUALITY,
+            optimize=True,
+        )
+    return buffer.getvalue()
+
+
+def get_stem(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def decode_image(file):
+    """Decode a photo and apply its EXIF orientation."""
+    try:
+        return ImageOps.exif_transpose(Image.open(file))
+    except (OSError, Image.DecompressionBombError):
+        raise serializers.ValidationError(
+            'Upload a valid image. The file you uploaded was either not '
+            'an image or a corrupted image.'
+        )
+
+
+def prepare_image(file):
+    """Decode an uploaded photo, strip its metadata and cap its size.
+
+    Returns the file to store and the decoded image for the variants.
+    Photos with transparency are kept as PNG, the rest become JPEG.
+    """
+    image = decode_image(file)
+    max_size = settings.RECIPE_IMAGE_MAX_SIZE
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    if has_alpha(image):
+        image, image_format = image.convert('RGBA'), 'PNG'
+    else:
+        image, image_format = image.convert('RGB'), 'JPEG'
+    image.info = {}
+    content = ContentFile(
+        encode(image, image_format),
+        name=f'{get_stem(file.name)}.{EXTENSIONS[image_format]}',
+    )
+    return content, image
+
+
+def make_variants(recipe_id, name, image):
+    """Store card and thumbnail variants of a recipe photo.
+
+    The recipe is only updated if it still has the photo the variants
+    were made from.
+    """
+    image_format = get_variant_format()
+    upload_to = Recipe._meta.get_field('image').upload_to
+    values = {}
+    for field, suffix, size in get_variants():
+        variant = image.copy()
+        variant.thumbnail((size, size), Image.LANCZOS)
+        values[field] = default_storage.save(
+            f'{upload_to}{get_stem(name)}_{suffix}.'
+            f'{EXTENSIONS[image_format]}',
+            ContentFile(encode(variant, image_format)),
+        )
+    if Recipe.objects.filter(pk=recipe_id, image=name).update(**values):
+        invalidate_recipes([recipe_id])
+
+
+def run_variants_job(recipe_id, name, image):
+    close_old_connections()
+    try:
+        make_variants(recipe_id, name, image)
+    except Exception:
+        logger.exception('Could not make variants of recipe %s', recipe_id)
+        raise
+    finally:
+        close_old_connections()
+
+
+def submit_variants(recipe, image):
+    """Render the variants in the background after the transaction."""
+    recipe_id, name = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(
+            run_variants_job, recipe_id, name, image
+        )
+    )
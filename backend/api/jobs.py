@@ -0,0 +1,161 @@
+"""Background rendering of shopping list PDFs.
+
+Job state is kept in the database, so any worker can answer a poll.
+Finished files are stored under SHOPPING_LIST_JOB_ROOT, outside
+MEDIA_ROOT, and are served to their owner through the API only. Starting
+a job replaces the owner's finished ones, and any job expires after
+SHOPPING_LIST_JOB_EXPIRE_HOURS, so rows and files do not pile up.
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api.pdf import get_pdf
+from backend.query_budget import uncounted
+from recipes.models import ShoppingListJob
+
+STATUS_PENDING = ShoppingListJob.STATUS_PENDING
+STATUS_DONE = ShoppingListJob.STATUS_DONE
+STATUS_FAILED = ShoppingListJob.STATUS_FAILED
+# Pending jobs older than this are assumed lost with their worker.
+STALE_AFTER = timedelta(hours=1)
+
+_executor = None
+
+
+class SyncExecutor:
+    """Runs jobs in the calling thread, for tests and local debugging.
+
+    The queries of a job are not counted against the budget of the request
+    that submitted it, just as they would not be in a worker thread.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        with uncounted():
+            fn(*args, **kwargs)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        if settings.SHOPPING_LIST_JOB_EXECUTOR == 'sync':
+            _executor = SyncExecutor()
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SHOPPING_LIST_JOB_WORKERS,
+                thread_name_prefix='api-job',
+            )
+    return _executor
+
+
+def get_storage():
+    return FileSystemStorage(location=settings.SHOPPING_LIST_JOB_ROOT)
+
+
+def get_job_id(user, title, ingredient_list):
+    return hashlib.sha256(
+        repr((user.id, title, list(ingredient_list))).encode('utf-8')
+    ).hexdigest()
+
+
+def get_job_path(job_id):
+    return f'{job_id}.pdf'
+
+
+def get_job(job_id, user):
+    return ShoppingListJob.objects.filter(pk=job_id, user=user).first()
+
+
+def set_status(job_id, status):
+    ShoppingListJob.objects.filter(pk=job_id).update(
+        status=status, updated=timezone.now()
+    )
+
+
+def is_reusable(job):
+    if job.status == STATUS_DONE:
+        return get_storage().exists(get_job_path(job.id))
+    return (
+        job.status == STATUS_PENDING
+        and job.updated > timezone.now() - STALE_AFTER
+    )
+
+
+def delete_old_jobs(user, job_id):
+    """Delete the user's other finished jobs and all expired ones."""
+    expired = timezone.now() - timedelta(
+        hours=settings.SHOPPING_LIST_JOB_EXPIRE_HOURS
+    )
+    old_ids = list(
+        ShoppingListJob.objects.filter(
+            Q(user=user) & ~Q(status=STATUS_PENDING) & ~Q(pk=job_id)
+            | Q(updated__lt=expired)
+        ).values_list('id', flat=True)
+    )
+    if not old_ids:
+        return
+    ShoppingListJob.objects.filter(pk__in=old_ids).delete()
+
+    def delete_files():
+        storage = get_storage()
+        for old_id in old_ids:
+            storage.delete(get_job_path(old_id))
+
+    transaction.on_commit(delete_files)
+
+
+def run_pdf_job(job_id, title, ingredient_list):
+    close_old_connections()
+    try:
+        content = get_pdf(title, ingredient_list)
+        storage = get_storage()
+        path = get_job_path(job_id)
+        if storage.exists(path):
+            storage.delete(path)
+        storage.save(path, ContentFile(content))
+    except Exception:
+        set_status(job_id, STATUS_FAILED)
+        raise
+    else:
+        set_status(job_id, STATUS_DONE)
+    finally:
+        close_old_connections()
+
+
+def submit_pdf_job(user, title, ingredient_list):
+    """Start rendering the shopping list PDF in the background.
+
+    Jobs are keyed on the user and the aggregated list, so an unchanged cart
+    reuses the job that is already running or finished. A new job replaces
+    the user's finished ones.
+    """
+    job_id = get_job_id(user, title, ingredient_list)
+    job = get_job(job_id, user)
+    if job is None:
+        try:
+            ShoppingListJob.objects.create(id=job_id, user=user)
+        except IntegrityError:
+            # The same list was submitted by a concurrent request.
+            return get_job(job_id, user)
+    elif is_reusable(job):
+        return job
+    else:
+        set_status(job_id, STATUS_PENDING)
+    delete_old_jobs(user, job_id)
+    transaction.on_commit(
+        lambda: get_executor().submit(
+            run_pdf_job, job_id, title, ingredient_list
+        )
+    )
+    return get_job(job_id, user)
+
+
+def open_job_file(job):
+    return get_storage().open(get_job_path(job.id))
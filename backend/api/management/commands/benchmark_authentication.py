@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import (
+    LOCAL_CACHE, CachedTokenAuthentication, get_cache_key
+)
+from recipes.benchmarks import BenchmarkCommand, Timings, get_user
+from recipes.management.commands.seed_data import USERNAME_PREFIX
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare the per-request overhead of TokenAuthentication and '
+        'CachedTokenAuthentication and write it as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Authenticated requests per variant (default: 1000).',
+        )
+        parser.add_argument(
+            '--user',
+            help=(
+                'Username to authenticate as '
+                f'(default: the first {USERNAME_PREFIX}* user).'
+            ),
+        )
+
+    def measure(self, authentication, request, requests, before=None):
+        timings = Timings('us')
+        for _ in range(requests):
+            if before is not None:
+                before()
+            with timings:
+                authentication.authenticate(request)
+        return timings
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+        user = get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        request = APIRequestFactory().get(
+            '/api/users/me/', HTTP_AUTHORIZATION=f'Token {token}'
+        )
+        cache_key = get_cache_key(token.key)
+        local_cache = caches[LOCAL_CACHE]
+
+        def drop_local():
+            local_cache.delete(cache_key)
+
+        cached = CachedTokenAuthentication()
+        timings = {
+            'stock': self.measure(
+                TokenAuthentication(), request, options['requests']
+            ),
+        }
+        # One process needs no shared cache, so this also runs on LocMem.
+        with override_settings(
+            TOKEN_CACHE_TIMEOUT=settings.TOKEN_CACHE_TIMEOUT or 300
+        ):
+            cached.authenticate(request)
+            timings['cached_local'] = self.measure(
+                cached, request, options['requests']
+            )
+            timings['cached_shared'] = self.measure(
+                cached, request, options['requests'], drop_local
+            )
+        local_cache.delete(cache_key)
+        cache.delete(cache_key)
+
+        for name, variant in timings.items():
+            self.write_progress(name, variant.describe())
+        self.write_report(results={
+            name: variant.summary() for name, variant in timings.items()
+        })
@@ -0,0 +1,101 @@
+from django.core.management.base import CommandError
+from rest_framework.test import APIClient
+
+from api.pagination import KeysetPagination
+from recipes.benchmarks import (
+    BenchmarkCommand, Timings, get_user, test_environment
+)
+from recipes.management.commands.seed_data import USERNAME_PREFIX
+from recipes.models import Recipe
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare the latency of deep recipe feed pages with OFFSET and '
+        'keyset (cursor) pagination, as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            nargs='+',
+            default=[1, 100, 10000],
+            help='Page numbers to request (default: 1 100 10000).',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=6,
+            help='Recipes per page, as the frontend asks (default: 6).',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20,
+            help='Requests per page and variant (default: 20).',
+        )
+        parser.add_argument(
+            '--user',
+            help=(
+                'Username to authenticate as, anonymous lists are cached '
+                f'(default: the first {USERNAME_PREFIX}* user).'
+            ),
+        )
+
+    def get_cursor(self, page, limit):
+        """Cursor the client holds after reading the previous pages."""
+        if page == 1:
+            return ''
+        last = Recipe.objects.order_by(*KeysetPagination.ordering)[
+            (page - 1) * limit - 1
+        ]
+        return KeysetPagination().encode_cursor(last)
+
+    def measure(self, client, url, requests):
+        timings = Timings()
+        for _ in range(requests):
+            with timings:
+                response = client.get(url)
+        return timings, response.status_code
+
+    def handle(self, *args, **options):
+        pages = sorted(set(options['pages']))
+        limit = options['limit']
+        if options['requests'] < 1 or limit < 1 or pages[0] < 1:
+            raise CommandError(
+                '--requests, --limit and --pages must be positive.'
+            )
+        recipes = Recipe.objects.count()
+        if recipes < pages[-1] * limit:
+            raise CommandError(
+                f'Page {pages[-1]} of {limit} recipes needs '
+                f'{pages[-1] * limit} recipes, there are {recipes}. '
+                f'Run seed_data with more users.'
+            )
+        user = get_user(options['user'])
+
+        results = {}
+        with test_environment():
+            client = APIClient()
+            client.force_authenticate(user)
+            for page in pages:
+                urls = {
+                    'offset': f'/api/recipes/?limit={limit}&page={page}',
+                    'keyset': (
+                        f'/api/recipes/?limit={limit}&cursor='
+                        f'{self.get_cursor(page, limit)}'
+                    ),
+                }
+                results[str(page)] = {}
+                for name, url in urls.items():
+                    timings, status = self.measure(
+                        client, url, options['requests']
+                    )
+                    results[str(page)][name] = {
+                        'status': status, **timings.summary()
+                    }
+                    self.write_progress(
+                        f'страница {page}, {name}', timings.describe()
+                    )
+        self.write_report(recipes=recipes, limit=limit, results=results)
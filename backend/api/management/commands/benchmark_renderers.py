@@ -0,0 +1,97 @@
+import json
+
+from django.core.management.base import CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import RecipeViewSerializer
+from recipes.benchmarks import BenchmarkCommand, Timings, get_user
+from recipes.models import Recipe
+
+RENDERERS = (
+    ('drf', JSONRenderer),
+    ('fast', FastJSONRenderer),
+)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare the DRF JSON renderer with FastJSONRenderer (orjson when '
+        'installed) on serialized recipe list pages, as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limits',
+            type=int,
+            nargs='+',
+            default=[6, 100],
+            help='Recipes per page (default: 6 100).',
+        )
+        parser.add_argument(
+            '--renders',
+            type=int,
+            default=1000,
+            help='Renders per page size and renderer (default: 1000).',
+        )
+        parser.add_argument(
+            '--user',
+            help='Username to serialize for (default: the first seeded '
+                 'user).',
+        )
+
+    def get_page(self, limit, user):
+        """A recipe list response body, as the API builds it."""
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        recipes = Recipe.objects.select_related('author').order_by(
+            '-pub_date', '-id'
+        )[:limit]
+        return {
+            'count': Recipe.objects.count(),
+            'next': f'http://testserver/api/recipes/?limit={limit}&page=2',
+            'previous': None,
+            'results': RecipeViewSerializer(
+                recipes, many=True, context={'request': request}
+            ).data,
+        }
+
+    def measure(self, renderer, data, renders):
+        # Rendering runs no queries.
+        timings = Timings('us', count_queries=False)
+        for _ in range(renders):
+            with timings:
+                content = renderer.render(data, 'application/json')
+        return content, timings
+
+    def handle(self, *args, **options):
+        limits = sorted(set(options['limits']))
+        if options['renders'] < 1 or limits[0] < 1:
+            raise CommandError('--renders and --limits must be positive.')
+        user = get_user(options['user'])
+
+        results = {}
+        for limit in limits:
+            data = self.get_page(limit, user)
+            results[str(limit)] = {}
+            contents = []
+            for name, renderer_class in RENDERERS:
+                content, timings = self.measure(
+                    renderer_class(), data, options['renders']
+                )
+                contents.append(json.loads(content))
+                results[str(limit)][name] = {
+                    'bytes': len(content), **timings.summary()
+                }
+                self.write_progress(
+                    f'{limit} рецептов, {name}',
+                    f'{len(content)} байт',
+                    timings.describe(),
+                )
+            if contents[0] != contents[1]:
+                raise CommandError(
+                    f'The renderers disagree on a page of {limit} recipes.'
+                )
+        self.write_report(orjson=orjson is not None, results=results)
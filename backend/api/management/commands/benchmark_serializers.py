@@ -0,0 +1,116 @@
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fast import FastRecipeSerializer
+from api.serializers import RecipeViewSerializer
+from recipes.benchmarks import BenchmarkCommand, Timings, get_user
+from recipes.models import Recipe
+
+SERIALIZERS = (
+    ('drf', RecipeViewSerializer),
+    ('fast', FastRecipeSerializer),
+)
+CACHE_VARIANTS = (
+    ('no_cache', 0),
+    ('payload_cache', 300),
+)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Measure recipe serializer throughput over real feed pages, with '
+        'and without the payload cache, in recipes per second as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=20,
+            help='Feed pages to serialize (default: 20).',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=6,
+            help='Recipes per page, as the frontend asks (default: 6).',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=10,
+            help='Passes over the pages per variant (default: 10).',
+        )
+        parser.add_argument(
+            '--user',
+            help='Username to serialize for (default: the first seeded '
+                 'user).',
+        )
+
+    def get_request(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return request
+
+    def serialize(self, serializer_class, pages, limit, user, timings):
+        """Serialize every page once, timing the serializer only."""
+        recipes = Recipe.objects.select_related('author').order_by(
+            '-pub_date', '-id'
+        )
+        for page in range(pages):
+            instances = list(recipes[page * limit:(page + 1) * limit])
+            # A fresh request per page, as the API builds per response.
+            context = {'request': self.get_request(user)}
+            with timings:
+                serializer_class(instances, many=True, context=context).data
+
+    def measure(self, serializer_class, options, user):
+        pages, limit = options['pages'], options['limit']
+        # Warms the payload cache, and Python's caches for both variants.
+        self.serialize(serializer_class, pages, limit, user, Timings())
+        timings = Timings()
+        for _ in range(options['rounds']):
+            self.serialize(serializer_class, pages, limit, user, timings)
+        recipes = len(timings.values) * limit
+        return timings, {
+            'recipes_per_second': round(
+                recipes / (sum(timings.values) / 1000)
+            ),
+            **timings.summary(),
+        }
+
+    def handle(self, *args, **options):
+        if min(options['pages'], options['limit'], options['rounds']) < 1:
+            raise CommandError(
+                '--pages, --limit and --rounds must be positive.'
+            )
+        recipes = Recipe.objects.count()
+        if recipes < options['pages'] * options['limit']:
+            raise CommandError(
+                f'{options["pages"]} pages of {options["limit"]} recipes '
+                f'need {options["pages"] * options["limit"]} recipes, '
+                f'there are {recipes}. Run seed_data.'
+            )
+        user = get_user(options['user'])
+
+        results = {}
+        for name, serializer_class in SERIALIZERS:
+            results[name] = {}
+            for variant, timeout in CACHE_VARIANTS:
+                cache.clear()
+                with override_settings(RECIPE_PAYLOAD_CACHE_TIMEOUT=timeout):
+                    timings, result = self.measure(
+                        serializer_class, options, user
+                    )
+                results[name][variant] = result
+                self.write_progress(
+                    f'{name}, {variant}',
+                    f'{result["recipes_per_second"]} рецептов/с',
+                    timings.describe(),
+                )
+        self.write_report(
+            recipes=recipes, limit=options['limit'], results=results
+        )
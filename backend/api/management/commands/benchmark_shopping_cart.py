@@ -0,0 +1,129 @@
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from api.pdf import get_cache_key
+from api.renderers import (
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer,
+)
+from api.utils import generate_ingredient_list
+from api.views import get_shopping_cart_title
+from recipes.benchmarks import BenchmarkCommand, Timings, test_environment
+from recipes.models import Cart, Recipe
+from users.models import User
+
+MEDIA_TYPES = {
+    renderer.format: renderer.media_type
+    for renderer in (
+        PDFShoppingListRenderer,
+        TextShoppingListRenderer,
+        CSVShoppingListRenderer,
+        JSONShoppingListRenderer,
+    )
+}
+USERNAME = 'benchmark_shopping_cart'
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Time shopping list downloads of carts of growing size in each '
+        'format and report their size, CPU time and queries as JSON. '
+        'PDFs are rendered every time, bypassing the PDF cache. The carts '
+        'are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='Recipes per cart (default: 10 100 1000).',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20,
+            help='Downloads per cart size and format (default: 20).',
+        )
+        parser.add_argument(
+            '--formats',
+            nargs='+',
+            choices=list(MEDIA_TYPES),
+            default=list(MEDIA_TYPES),
+            help='Shopping list formats (default: all).',
+        )
+
+    def measure(self, client, media_type, requests, pdf_cache_key):
+        timings = Timings()
+        for _ in range(requests):
+            cache.delete(pdf_cache_key)
+            with timings:
+                response = client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    HTTP_ACCEPT=media_type,
+                )
+                content = b''.join(response)
+        return timings, {
+            'status': response.status_code,
+            'bytes': len(content),
+            **timings.summary(cpu=True),
+        }
+
+    def handle(self, *args, **options):
+        sizes = sorted(set(options['sizes']))
+        if options['requests'] < 1 or sizes[0] < 1:
+            raise CommandError('--requests and --sizes must be positive.')
+        recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)
+            [:sizes[-1]]
+        )
+        if len(recipe_ids) < sizes[-1]:
+            raise CommandError(
+                f'A cart of {sizes[-1]} recipes needs as many recipes, '
+                f'there are {len(recipe_ids)}. Run seed_data.'
+            )
+
+        results = {}
+        with test_environment(), transaction.atomic():
+            user = User.objects.create(
+                username=USERNAME,
+                email=f'{USERNAME}@example.com',
+                first_name='Benchmark',
+                last_name='Benchmark',
+            )
+            cart = Cart.objects.create(user=user)
+            client = APIClient()
+            client.force_authenticate(user)
+            for size in sizes:
+                # Filled without signals: counters are not measured.
+                Cart.recipes.through.objects.filter(cart=cart).delete()
+                Cart.recipes.through.objects.bulk_create(
+                    Cart.recipes.through(cart=cart, recipe_id=recipe_id)
+                    for recipe_id in recipe_ids[:size]
+                )
+                pdf_cache_key = get_cache_key(
+                    get_shopping_cart_title(user),
+                    generate_ingredient_list(user),
+                )
+                results[str(size)] = {}
+                for name in options['formats']:
+                    timings, result = self.measure(
+                        client,
+                        MEDIA_TYPES[name],
+                        options['requests'],
+                        pdf_cache_key,
+                    )
+                    results[str(size)][name] = result
+                    self.write_progress(
+                        f'{size} рецептов, {name}',
+                        f'{result["bytes"]} байт',
+                        f'CPU {result["cpu_ms"]} мс',
+                        timings.describe(),
+                    )
+            transaction.set_rollback(True)
+        self.write_report(results=results)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from rest_framework.exceptions import ValidationError
+
+from api.images import decode_image, make_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Generate card and thumbnail photos of recipes missing them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate variants of every recipe.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only('id', 'image')
+        if not options['all']:
+            recipes = recipes.filter(image_thumbnail='')
+        done = 0
+        for recipe in recipes.iterator():
+            try:
+                with recipe.image.open('rb') as file:
+                    image = decode_image(file)
+                make_variants(recipe.id, recipe.image.name, image)
+            except (OSError, ValidationError) as e:
+                self.stderr.write(self.style.ERROR(
+                    f'Рецепт {recipe.id}: {e}'
+                ))
+                continue
+            done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Созданы превью для {done} рецептов.'
+        ))
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import Cart, Recipe
+from users.models import Follow
+
+CACHE_PREFIX = 'membership'
+
+FAVORITES = 'favorites'
+CART = 'cart'
+FOLLOWS = 'follows'
+
+LOADERS = {
+    FAVORITES: lambda user_id: Recipe.favorite.through.objects.filter(
+        user_id=user_id
+    ).values_list('recipe_id', flat=True),
+    CART: lambda user_id: Cart.recipes.through.objects.filter(
+        cart__user_id=user_id
+    ).values_list('recipe_id', flat=True),
+    FOLLOWS: lambda user_id: Follow.objects.filter(
+        follower_id=user_id
+    ).values_list('author_id', flat=True),
+}
+
+
+class Membership:
+    """Favorite, cart and followed author ids of one user.
+
+    Each set is loaded on first use, from the shared cache when
+    MEMBERSHIP_CACHE_TIMEOUT is set, and kept for the rest of the request.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.sets = {}
+
+    def get_version_key(self):
+        return f'{CACHE_PREFIX}_version:{self.user_id}'
+
+    def get_cache_key(self, kind):
+        version = cache.get_or_set(self.get_version_key(), 1, None)
+        return f'{CACHE_PREFIX}:{self.user_id}:{kind}:{version}'
+
+    def load(self, kind):
+        timeout = settings.MEMBERSHIP_CACHE_TIMEOUT
+        if not timeout:
+            return frozenset(LOADERS[kind](self.user_id))
+        key = self.get_cache_key(kind)
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(LOADERS[kind](self.user_id))
+            cache.set(key, ids, timeout)
+        return ids
+
+    def get(self, kind):
+        if kind not in self.sets:
+            self.sets[kind] = self.load(kind)
+        return self.sets[kind]
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.get(FAVORITES)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.get(CART)
+
+    def is_subscribed(self, author_id):
+        return author_id in self.get(FOLLOWS)
+
+    def invalidate(self):
+        self.sets.clear()
+        try:
+            cache.incr(self.get_version_key())
+        except ValueError:
+            cache.set(self.get_version_key(), 1, None)
+
+
+def get_membership(request):
+    """Return the request user's `Membership`, None for anonymous users."""
+    if request is None or not request.user.is_authenticated:
+        return None
+    membership = getattr(request, 'membership', None)
+    if membership is None or membership.user_id != request.user.id:
+        membership = Membership(request.user.id)
+        request.membership = membership
+    return membership
@@ -1,5 +1,202 @@
+import base64
+import binascii
+import hashlib
+import json
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+COUNT_CACHE_PREFIX = 'pagination_count'
+COUNT_VERSION_CACHE_KEY = 'pagination_count_version'
+COUNT_CACHE_TIMEOUT = 60
+COUNT_ESTIMATE_THRESHOLD = 10000
+
+
+def get_count_version():
+    return cache.get_or_set(COUNT_VERSION_CACHE_KEY, 1, None)
+
+
+def invalidate_counts():
+    try:
+        cache.incr(COUNT_VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(COUNT_VERSION_CACHE_KEY, 1, None)
+
+
+def estimate_count(queryset):
+    """Planner row estimate for unfiltered querysets on PostgreSQL."""
+    query = queryset.query
+    if (connection.vendor != 'postgresql'
+            or query.where
+            or query.distinct):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < COUNT_ESTIMATE_THRESHOLD:
+        return None
+    return int(row[0])
+
+
+def get_cached_count(queryset):
+    try:
+        signature = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    key = (
+        f'{COUNT_CACHE_PREFIX}:{get_count_version()}:'
+        f'{hashlib.sha256(signature.encode("utf-8")).hexdigest()}'
+    )
+    count = cache.get(key)
+    if count is None:
+        count = estimate_count(queryset)
+        if count is None:
+            count = queryset.count()
+        cache.set(
+            key,
+            count,
+            settings.REST_FRAMEWORK.get(
+                'PAGINATION_COUNT_CACHE_TIMEOUT', COUNT_CACHE_TIMEOUT
+            ),
+        )
+    return count
+
+
+class CachedCountPaginator(DjangoPaginator):
+    @cached_property
+    def count(self):
+        return get_cached_count(self.object_list)
 
 
 class LimitPagePagination(PageNumberPagination):
+    """Page number pagination with the page size in `limit`.
+
+    `REST_FRAMEWORK['PAGINATION_COUNT_MODE'] = 'cached'` replaces the exact
+    COUNT(*) per page with a count cached per query, which is dropped on
+    recipe and subscription writes.
+    """
     page_size_query_param = 'limit'
+
+    @property
+    def django_paginator_class(self):
+        if settings.REST_FRAMEWORK.get('PAGINATION_COUNT_MODE') == 'cached':
+            return CachedCountPaginator
+        return DjangoPaginator
+
+
+class KeysetPagination(LimitPagePagination):
+    """Keyset pagination that clients opt into with the `cursor` parameter.
+
+    Without `cursor` it behaves like `LimitPagePagination`, so `page` and
+    `limit` keep working. With it, pages are selected by a WHERE on the
+    `ordering` fields of the last seen row instead of OFFSET, and no
+    COUNT(*) is run. An explicit `order_by()` on the queryset replaces
+    `ordering` and must end with a unique field.
+    """
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if queryset.query.order_by:
+            self.ordering = tuple(queryset.query.order_by)
+        cursor = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        queryset = queryset.order_by(*self.ordering)
+        if cursor is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(queryset.model, cursor)
+            )
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.last = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last)
+        )
+
+    def get_keyset_filter(self, model, cursor):
+        fields = [name.lstrip('-') for name in self.ordering]
+        try:
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(fields, cursor)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        conditions = []
+        for index, name in enumerate(self.ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            conditions.append(Q(
+                **dict(zip(fields[:index], values[:index])),
+                **{f'{fields[index]}__{lookup}': values[index]},
+            ))
+        # Redundant with the OR below, but lets the database start an index
+        # range scan at the cursor instead of filtering from the first row.
+        lookup = 'lte' if self.ordering[0].startswith('-') else 'gte'
+        bound = Q(**{f'{fields[0]}__{lookup}': values[0]})
+        return bound & reduce(lambda left, right: left | right, conditions)
+
+    def encode_cursor(self, obj):
+        values = [
+            obj._meta.get_field(name.lstrip('-')).value_to_string(obj)
+            for name in self.ordering
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode('utf-8')
+        ).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+
+class SubscriptionsKeysetPagination(KeysetPagination):
+    ordering = ('username', 'id')
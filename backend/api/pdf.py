@@ -0,0 +1,86 @@
+import io
+import hashlib
+from functools import lru_cache
+
+from django.core.cache import cache
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'Russian'
+FONT_FILE = 'RobotoMono-Regular.ttf'
+TITLE_FONT_SIZE = 16
+TEXT_FONT_SIZE = 12
+LINE_HEIGHT = 18
+LEFT_MARGIN = 60
+RIGHT_MARGIN = 530
+TOP_MARGIN = 50
+BOTTOM_MARGIN = 60
+MIN_ADDITION_SPACES = 3
+CACHE_PREFIX = 'shopping_list_pdf'
+CACHE_TIMEOUT = 60 * 60
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_FILE))
+
+
+def format_lines(ingredient_list):
+    lines = [
+        (f'{name} ({measurement_unit})', amount)
+        for name, measurement_unit, amount in ingredient_list
+    ]
+    max_line_length = max(
+        (
+            len(f'{name}{amount}') + MIN_ADDITION_SPACES
+            for name, amount in lines
+        ),
+        default=0,
+    )
+    for name, amount in lines:
+        additional_spaces = max_line_length - len(f'{name}{amount}')
+        yield f'{chr(2610)} {name}:{"_" * additional_spaces}{amount}'
+
+
+def render_pdf(title, ingredient_list):
+    register_font()
+    _, page_height = A4
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4, bottomup=0)
+
+    p.setFont(FONT_NAME, TITLE_FONT_SIZE)
+    p.drawString(LEFT_MARGIN, TOP_MARGIN, title.encode('utf-8'))
+    p.line(LEFT_MARGIN, TOP_MARGIN + 5, RIGHT_MARGIN, TOP_MARGIN + 5)
+
+    p.setFont(FONT_NAME, TEXT_FONT_SIZE)
+    y = TOP_MARGIN + 30
+    for line in format_lines(ingredient_list):
+        if y > page_height - BOTTOM_MARGIN:
+            p.showPage()
+            p.setFont(FONT_NAME, TEXT_FONT_SIZE)
+            y = TOP_MARGIN
+        p.drawString(LEFT_MARGIN, y, line.encode('utf-8'))
+        y += LINE_HEIGHT
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def get_cache_key(title, ingredient_list):
+    digest = hashlib.sha256(
+        repr((title, list(ingredient_list))).encode('utf-8')
+    ).hexdigest()
+    return f'{CACHE_PREFIX}:{digest}'
+
+
+def get_pdf(title, ingredient_list):
+    """Return rendered PDF bytes, reusing a cached copy of the same list."""
+    key = get_cache_key(title, ingredient_list)
+    content = cache.get(key)
+    if content is None:
+        content = render_pdf(title, ingredient_list)
+        cache.set(key, content, CACHE_TIMEOUT)
+    return content
@@ -0,0 +1,134 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from api.pdf import get_pdf
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if orjson is not None else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it is installed.
+
+    Types orjson does not handle natively (Decimal, datetimes, lazy
+    strings, querysets) go through DRF's encoder, so the output matches
+    JSONRenderer. Indented or ASCII-only output, and data orjson rejects,
+    fall back to the stdlib encoder. NaN and infinities render as null.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None
+                or data is None
+                or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=ORJSON_OPTIONS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Same escaping as JSONRenderer, for embedding in JavaScript.
+        ret = ret.replace('\u2028'.encode(), b'\\u2028')
+        return ret.replace('\u2029'.encode(), b'\\u2029')
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Base renderer for shopping list downloads.
+
+    Used for content negotiation only: the file is produced by `stream()`,
+    or by `render_file()` when `streaming` is off, error responses are
+    rendered as JSON by the view.
+    """
+    charset = 'utf-8'
+    streaming = True
+
+    def stream(self, title, ingredient_list):
+        raise NotImplementedError
+
+    def render_file(self, title, ingredient_list):
+        raise NotImplementedError
+
+    def get_filename(self, name):
+        return f'{name}.{self.format}'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    # The whole document is rendered before its first byte is known, so
+    # send it with a Content-Length instead of streaming it.
+    streaming = False
+
+    def render_file(self, title, ingredient_list):
+        return get_pdf(title, ingredient_list)
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, title, ingredient_list):
+        yield f'{title}\n\n'.encode(self.charset)
+        for name, measurement_unit, amount in ingredient_list:
+            yield f'{name} ({measurement_unit}) — {amount}\n'.encode(
+                self.charset
+            )
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, title, ingredient_list):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('name', 'measurement_unit', 'amount')
+        ).encode(self.charset)
+        for row in ingredient_list:
+            yield writer.writerow(row).encode(self.charset)
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, title, ingredient_list):
+        yield b'['
+        for index, (name, measurement_unit, amount) in enumerate(
+                ingredient_list
+        ):
+            item = json.dumps(
+                {
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                    'amount': amount,
+                },
+                ensure_ascii=False,
+            )
+            yield f'{"," if index else ""}{item}'.encode(self.charset)
+        yield b']'
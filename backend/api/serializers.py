@@ -1,3 +1,7 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
+from django.urls import reverse
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
@@ -8,8 +12,13 @@ from recipes.models import (
     Recipe,
     RecipeIngredients,
     Ingredient,
+    ShoppingListJob,
 )
 from users.models import User, Follow
+from api.cache import get_recipe_payloads
+from api.images import prepare_image, submit_variants
+from api.jobs import STATUS_DONE
+from api.membership import get_membership
 from api.validators import DoubleValidator
 
 
@@ -28,14 +37,8 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return (
-                self.context['request'].user.is_authenticated
-                and
-                Follow.objects.filter(
-                    follower=self.context['request'].user,
-                    author=obj
-                ).exists()
-                )
+        membership = get_membership(self.context.get('request'))
+        return membership is not None and membership.is_subscribed(obj.id)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -82,7 +85,28 @@ class RecipeIngredientsSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        return self.child.to_representation_many(list(iterable))
+
+
 class RecipeViewSerializer(serializers.ModelSerializer):
+    """Recipe with nested tags, author and ingredients.
+
+    With RECIPE_PAYLOAD_CACHE_TIMEOUT set, the user-independent part of
+    each recipe is cached and only the per-user flags are computed per
+    request.
+    """
+    prefetch = (
+        'tags',
+        Prefetch(
+            'ingredients',
+            queryset=RecipeIngredients.objects.select_related('ingredient'),
+        ),
+    )
+    payload_cache = True
+
     author = UserSerializer()
     tags = TagSerializer(many=True)
     ingredients = RecipeIngredientsSerializer(many=True)
@@ -100,30 +124,69 @@ class RecipeViewSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_card',
+            'image_thumbnail',
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
+
+    def to_representation_many(self, instances):
+        if not self.payload_cache:
+            return self.render(instances)
+        request = self.context.get('request')
+        data = get_recipe_payloads(
+            instances,
+            request.get_host() if request is not None else '',
+            self.render,
+        )
+        for instance, payload in zip(instances, data):
+            payload['is_favorited'] = self.get_is_favorited(instance)
+            payload['is_in_shopping_cart'] = (
+                self.get_is_in_shopping_cart(instance)
+            )
+            payload['author']['is_subscribed'] = (
+                self.fields['author'].get_is_subscribed(instance.author)
+            )
+        return data
+
+    def render(self, instances):
+        """Payloads with the per-user flags unset, safe to share."""
+        prefetch_related_objects(instances, *self.prefetch)
+        data = [
+            super(RecipeViewSerializer, self).to_representation(instance)
+            for instance in instances
+        ]
+        for payload in data:
+            payload['is_favorited'] = False
+            payload['is_in_shopping_cart'] = False
+            payload['author']['is_subscribed'] = False
+        return data
 
     def get_is_favorited(self, obj):
-        return (
-                self.context['request'].user.is_authenticated
-                and
-                self.context['request'].user.favorite_recipes.filter(
-                    id=obj.id
-                ).exists()
-                )
+        membership = get_membership(self.context.get('request'))
+        return membership is not None and membership.is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        try:
-            return (
-                self.context['request'].user.is_authenticated
-                and
-                self.context['request'].user.cart.recipes.filter(
-                    id=obj.id
-                ).exists()
-                )
-        except User.cart.RelatedObjectDoesNotExist:
-            return False
+        membership = get_membership(self.context.get('request'))
+        return (
+            membership is not None
+            and membership.is_in_shopping_cart(obj.id)
+        )
+
+
+def sum_amounts(ingredients):
+    """Amounts by ingredient id, repeated ingredients added up."""
+    amounts = {}
+    for ingredient in ingredients:
+        ingredient_id = ingredient['ingredient']['id']
+        amounts[ingredient_id] = (
+            amounts.get(ingredient_id, 0) + ingredient['amount']
+        )
+    return amounts
 
 
 class RecipeEditIngredientsSerializer(RecipeIngredientsSerializer):
@@ -135,16 +198,32 @@ class RecipeEditIngredientsSerializer(RecipeIngredientsSerializer):
         )
 
 
+class TagIdsField(serializers.ListField):
+    """Tag ids, looked up in a single query."""
+    child = serializers.IntegerField()
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        tags = Tag.objects.in_bulk(ids)
+        for tag_id in ids:
+            if tag_id not in tags:
+                raise serializers.ValidationError(
+                    f'Object with id={tag_id} does not exist.'
+                )
+        return [tags[tag_id] for tag_id in ids]
+
+    def to_representation(self, data):
+        return [tag.id for tag in data.all()]
+
+
 class RecipeEditSerializer(RecipeViewSerializer):
+    payload_cache = False
+
     author = serializers.SlugRelatedField(
         slug_field='username',
         read_only=True
     )
-    tags = serializers.SlugRelatedField(
-        slug_field='id',
-        queryset=Tag.objects.all(),
-        many=True,
-    )
+    tags = TagIdsField()
     image = Base64ImageField(
         allow_null=False,
         allow_empty_file=False,
@@ -170,6 +249,7 @@ class RecipeEditSerializer(RecipeViewSerializer):
     def validate_image(self, value):
         if not value:
             raise serializers.ValidationError('This field may not be blank.')
+        value, self.decoded_image = prepare_image(value)
         return value
 
     def validate_cooking_time(self, value):
@@ -177,60 +257,87 @@ class RecipeEditSerializer(RecipeViewSerializer):
             raise serializers.ValidationError('One minute or more')
         return value
 
-    def ingredients_and_tags_add(self, recipe, ingredients, tags):
-        ingredients_update = []
-        for ingredient in ingredients:
-            ingredients_update.append(
-                RecipeIngredients(
-                    ingredient=Ingredient.objects.get(
-                        id=ingredient['ingredient']['id']
-                    ),
-                    amount=ingredient['amount'],
-                    recipe=Recipe.objects.get(id=recipe.id),
-                )
-            )
-        RecipeIngredients.objects.bulk_create(
-            ingredients_update,
-            ignore_conflicts=True,
+    def validate_ingredients(self, value):
+        amounts = sum_amounts(value)
+        missing = set(amounts) - set(
+            Ingredient.objects.in_bulk(list(amounts))
         )
+        if missing:
+            raise serializers.ValidationError(
+                f'Ingredients not found: '
+                f'{", ".join(map(str, sorted(missing)))}'
+            )
+        amount_field = RecipeIngredients._meta.get_field('amount')
+        for ingredient_id, amount in amounts.items():
+            try:
+                amount_field.run_validators(amount)
+            except DjangoValidationError as e:
+                raise serializers.ValidationError(
+                    f'Total amount of ingredient {ingredient_id}: '
+                    f'{" ".join(e.messages)}'
+                )
+        return value
 
-        for tag in tags:
-            recipe.tags.add(tag)
-
+    def set_ingredients(self, recipe, ingredients):
+        amounts = sum_amounts(ingredients)
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredients.objects.filter(
+                recipe_id=recipe.id
+            )
+        }
+        ingredients_create = []
+        ingredients_update = []
+        for ingredient_id, amount in amounts.items():
+            recipe_ingredient = current.pop(ingredient_id, None)
+            if recipe_ingredient is None:
+                ingredients_create.append(
+                    RecipeIngredients(
+                        recipe_id=recipe.id,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                    )
+                )
+            elif recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                ingredients_update.append(recipe_ingredient)
+
+        if current:
+            RecipeIngredients.objects.filter(
+                id__in=[
+                    recipe_ingredient.id
+                    for recipe_ingredient in current.values()
+                ]
+            ).delete()
+        RecipeIngredients.objects.bulk_create(ingredients_create)
+        RecipeIngredients.objects.bulk_update(ingredients_update, ['amount'])
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        self.ingredients_and_tags_add(
-            recipe=recipe,
-            ingredients=ingredients,
-            tags=tags
-        )
-        recipe.save()
+        self.set_ingredients(recipe, ingredients)
+        recipe.tags.set(tags)
+        submit_variants(recipe, self.decoded_image)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
 
-        RecipeIngredients.objects.filter(
-            recipe_id=instance.id
-        ).delete()
-
-        for tag in instance.tags.all():
-            instance.tags.remove(tag)
-
-        self.ingredients_and_tags_add(
-            recipe=instance,
-            ingredients=ingredients,
-            tags=tags
-        )
+        self.set_ingredients(instance, ingredients)
+        instance.tags.set(tags)
 
         for field, value in validated_data.items():
             setattr(instance, field, value)
+        if 'image' in validated_data:
+            instance.image_card = instance.image_thumbnail = None
 
         instance.save()
+        if 'image' in validated_data:
+            submit_variants(instance, self.decoded_image)
         return instance
 
 
@@ -241,6 +348,8 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_card',
+            'image_thumbnail',
             'cooking_time',
         )
 
@@ -263,9 +372,15 @@ class SubscriptionsViewSerializer(UserSerializer):
         )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return ShortRecipeSerializer(
+                obj.limited_recipes, many=True
+            ).data
         try:
             recipes_limit = int(
                 self.context['request'].query_params.get('recipes_limit')
@@ -305,3 +420,22 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                 message="You can't follow yourself",
             ),
         ]
+
+
+class ShoppingListJobSerializer(serializers.ModelSerializer):
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShoppingListJob
+        fields = (
+            'id',
+            'status',
+            'file',
+        )
+
+    def get_file(self, obj):
+        if obj.status != STATUS_DONE:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('api:recipe-download-shopping-cart-file', args=[obj.id])
+        )
@@ -0,0 +1,100 @@
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_token_keys, invalidate_user_tokens
+from api.cache import (
+    invalidate_all_recipes, invalidate_ordered_lists, invalidate_recipes
+)
+from api.filters import ORDERINGS
+from api.pagination import invalidate_counts
+from recipes.events import counters_refreshed, recipes_bulk_written
+from recipes.models import Cart, Recipe, RecipeIngredients, Tag
+from users.models import Follow, User
+
+# Fields that lists are ordered by, id only breaks ties.
+ORDERING_FIELDS = {fields[0].lstrip('-') for fields in ORDERINGS.values()}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def recipes_changed(sender, **kwargs):
+    invalidate_counts()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.favorite.through)
+@receiver(m2m_changed, sender=Cart.recipes.through)
+def recipe_relations_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_counts()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_recipes([instance.id])
+
+
+@receiver(counters_refreshed)
+def counters_changed(sender, fields, **kwargs):
+    # Counters are not rendered, only the lists ordered by them change.
+    if ORDERING_FIELDS.intersection(fields):
+        invalidate_ordered_lists()
+
+
+@receiver(recipes_bulk_written)
+def recipes_bulk_changed(sender, **kwargs):
+    invalidate_all_recipes()
+    invalidate_counts()
+
+
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate_recipes(
+        Recipe.tags.through.objects
+        .filter(tag_id=instance.id)
+        .values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_recipes([instance.id])
+    elif pk_set is not None:
+        invalidate_recipes(pk_set)
+    else:
+        invalidate_all_recipes()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    invalidate_user_tokens(instance.id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token_keys([instance.key])
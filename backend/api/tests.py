@@ -0,0 +1,1148 @@
+import base64
+import io
+import os
+import re
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import (
+    APIClient, APIRequestFactory, APITestCase, APITransactionTestCase
+)
+
+from api.authentication import get_cache_key
+from api.checks import check_token_cache
+from api.filters import RecipeFilterBackend
+from api.jobs import get_job_path, get_storage
+from api.membership import FAVORITES, LOADERS, Membership
+from api.pagination import estimate_count, get_cached_count
+from api.renderers import FastJSONRenderer, orjson
+from api.views import TagViewSet
+from backend.query_budget import QueryBudgetExceeded
+from recipes.models import (
+    Cart, Ingredient, Recipe, RecipeIngredients, ShoppingListJob, Tag
+)
+from users.models import Follow, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+JOB_ROOT = tempfile.mkdtemp()
+
+
+def create_user(index):
+    return User.objects.create_user(
+        email=f'user{index}@example.com',
+        username=f'user{index}',
+        first_name='Name',
+        last_name='Surname',
+        password='password',
+    )
+
+
+def get_image_data(size=(40, 30), image_format='PNG', mode='RGB', **options):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 120, 40)).save(
+        buffer, image_format, **options
+    )
+    return (
+        f'data:image/{image_format.lower()};base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+def create_recipe(author, tags, ingredients, index=0):
+    recipe = Recipe.objects.create(
+        author=author,
+        name=f'Recipe {index}',
+        text='Text',
+        image='recipes_photos/recipe.jpg',
+        cooking_time=10,
+    )
+    recipe.tags.set(tags)
+    RecipeIngredients.objects.bulk_create(
+        RecipeIngredients(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class APITestBase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Tag {index}',
+                slug=f'tag{index}',
+                color=f'#00000{index}',
+            )
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ingredient {index}',
+                measurement_unit='g',
+            )
+            for index in range(5)
+        ]
+        cls.author = create_user(0)
+        cls.user = create_user(1)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        caches['tokens'].clear()
+
+
+@override_settings(RECIPE_PAYLOAD_CACHE_TIMEOUT=300)
+class RecipePayloadCacheTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.author, self.tags, self.ingredients)
+        self.recipe.favorite.add(self.user)
+        Cart.objects.create(user=self.user).recipes.add(self.recipe)
+        Follow.objects.create(follower=self.user, author=self.author)
+        self.detail_url = f'/api/recipes/{self.recipe.id}/'
+
+    def get_flags(self, url, user=None):
+        self.client.force_authenticate(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        if 'results' in data:
+            data = data['results'][0]
+        return (
+            data['is_favorited'],
+            data['is_in_shopping_cart'],
+            data['author']['is_subscribed'],
+        )
+
+    def test_flags_of_one_user_are_not_cached_for_others(self):
+        for fast in (False, True):
+            for url in (self.detail_url, '/api/recipes/'):
+                with self.subTest(fast=fast, url=url):
+                    cache.clear()
+                    with override_settings(FAST_READ_SERIALIZERS=False):
+                        self.assertEqual(
+                            self.get_flags(url, self.user),
+                            (True, True, True),
+                        )
+                    with override_settings(FAST_READ_SERIALIZERS=fast):
+                        self.assertEqual(
+                            self.get_flags(url), (False, False, False)
+                        )
+                        self.assertEqual(
+                            self.get_flags(url, self.author),
+                            (False, False, False),
+                        )
+
+
+@override_settings(RECIPE_RESPONSE_CACHE_TIMEOUT=0)
+class FastSerializerContractTests(APITestBase):
+    """The fast serializers render the same JSON as the DRF ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = [
+            create_recipe(
+                author,
+                cls.tags[:index % 3 + 1],
+                cls.ingredients[index % 2:],
+                index,
+            )
+            for index, author in enumerate(
+                [cls.author, cls.user, cls.author, cls.author]
+            )
+        ]
+        cls.recipes[0].favorite.add(cls.user)
+        Cart.objects.create(user=cls.user).recipes.add(cls.recipes[2])
+        Follow.objects.create(follower=cls.user, author=cls.author)
+
+    def get_urls(self):
+        return [
+            '/api/tags/',
+            f'/api/tags/{self.tags[0].id}/',
+            '/api/ingredients/',
+            f'/api/ingredients/{self.ingredients[0].id}/',
+            '/api/recipes/',
+            '/api/recipes/?limit=2&page=2',
+            f'/api/recipes/{self.recipes[0].id}/',
+            f'/api/recipes/{self.recipes[1].id}/',
+        ]
+
+    def get_content(self, url, fast):
+        cache.clear()
+        with override_settings(FAST_READ_SERIALIZERS=fast):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assert_same_json(self, urls):
+        for payload_cache in (0, 300):
+            for url in urls:
+                with self.subTest(url=url, payload_cache=payload_cache):
+                    with override_settings(
+                        RECIPE_PAYLOAD_CACHE_TIMEOUT=payload_cache
+                    ):
+                        self.assertEqual(
+                            self.get_content(url, fast=True),
+                            self.get_content(url, fast=False),
+                        )
+
+    def test_anonymous(self):
+        self.assert_same_json(self.get_urls())
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.assert_same_json(self.get_urls() + [
+            '/api/users/subscriptions/',
+            '/api/users/subscriptions/?recipes_limit=1',
+        ])
+
+
+class RecipeListQueryTests(APITestBase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(12):
+            recipe = create_recipe(
+                [cls.author, cls.user][index % 2],
+                cls.tags[:index % 3 + 1],
+                cls.ingredients[:index % 5 + 1],
+                index,
+            )
+            if index % 3 == 0:
+                recipe.favorite.add(cls.user)
+        Cart.objects.create(user=cls.user).recipes.set(
+            Recipe.objects.all()[:4]
+        )
+        Follow.objects.create(follower=cls.user, author=cls.author)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for user in (None, self.user):
+            self.client.force_authenticate(user)
+            with self.subTest(user=user):
+                small, small_data = self.count_queries('/api/recipes/?limit=1')
+                large, large_data = self.count_queries(
+                    '/api/recipes/?limit=12'
+                )
+                self.assertEqual(len(small_data['results']), 1)
+                self.assertEqual(len(large_data['results']), 12)
+                self.assertEqual(small, large)
+
+
+class KeysetPaginationTests(APITestBase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(7):
+            create_recipe(cls.author, [], [], index)
+        # Ties on pub_date are broken by id.
+        first = Recipe.objects.order_by('id').first()
+        Recipe.objects.filter(id__lte=first.id + 3).update(
+            pub_date=first.pub_date
+        )
+
+    def test_cursor_walks_every_recipe_once(self):
+        self.client.force_authenticate(self.user)
+        ids = []
+        url = '/api/recipes/?limit=2&cursor='
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(ids, list(
+            Recipe.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        ))
+
+
+class RecipeFilterTests(APITestBase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cart = Cart.objects.create(user=cls.user)
+        cls.recipes = {}
+        for name, author, tags, favorited, in_cart in (
+                ('match', cls.author, cls.tags[:2], True, True),
+                ('other_tag', cls.author, cls.tags[2:], True, True),
+                ('not_favorited', cls.author, cls.tags[:2], False, True),
+                ('not_in_cart', cls.author, cls.tags[:2], True, False),
+                ('other_author', cls.user, cls.tags[:2], True, True),
+        ):
+            recipe = create_recipe(author, tags, [], len(cls.recipes))
+            if favorited:
+                recipe.favorite.add(cls.user)
+            if in_cart:
+                cart.recipes.add(recipe)
+            cls.recipes[name] = recipe
+
+    def get_params(self):
+        return {
+            'tags': [tag.slug for tag in self.tags[:2]],
+            'is_favorited': '1',
+            'is_in_shopping_cart': '1',
+            'author': str(self.author.id),
+        }
+
+    def filter_recipes(self, params):
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = self.user
+        return RecipeFilterBackend().filter_queryset(
+            request, Recipe.objects.all(), view=None
+        )
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan than to search.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_combined_filters(self):
+        # Matching both tags still lists the recipe once.
+        self.assertEqual(
+            list(self.filter_recipes(self.get_params()).values_list(
+                'id', flat=True
+            )),
+            [self.recipes['match'].id],
+        )
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/', self.get_params())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.recipes['match'].id],
+        )
+
+    def test_combined_filters_use_indexes(self):
+        self.assertNotRegex(
+            self.explain(self.filter_recipes(self.get_params())),
+            r'Seq Scan|\bSCAN\b',
+        )
+
+    def test_favorites_of_user_use_index(self):
+        self.assertIn(
+            'recipes_recipe_favorite_user_recipe_idx',
+            self.explain(LOADERS[FAVORITES](self.user.id)),
+        )
+
+
+def with_count_mode(mode):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'PAGINATION_COUNT_MODE': mode,
+    })
+
+
+class PaginationCountTests(APITestBase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = [
+            create_recipe(cls.author, [], [], index) for index in range(3)
+        ]
+
+    def get_count(self, url='/api/recipes/'):
+        """The page count and whether a COUNT query computed it."""
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        counted = any(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        )
+        return response.json()['count'], counted
+
+    @with_count_mode('exact')
+    def test_exact_mode_counts_every_page(self):
+        for _ in range(2):
+            self.assertEqual(self.get_count(), (3, True))
+
+    @with_count_mode('cached')
+    def test_cached_mode_counts_once(self):
+        self.assertEqual(self.get_count(), (3, True))
+        self.assertEqual(self.get_count(), (3, False))
+
+    @with_count_mode('cached')
+    def test_cached_count_follows_writes(self):
+        for url, write, count in (
+                ('/api/recipes/',
+                 lambda: create_recipe(self.author, [], [], 3), 4),
+                ('/api/users/subscriptions/',
+                 lambda: Follow.objects.create(
+                     follower=self.user, author=self.author
+                 ), 1),
+                ('/api/recipes/?is_favorited=1',
+                 lambda: self.recipes[0].favorite.add(self.user), 1),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.get_count(url), (count - 1, True))
+                write()
+                self.assertEqual(self.get_count(url), (count, True))
+
+    def test_estimate_for_large_unfiltered_tables(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = (50000.0, )
+        database = mock.Mock(vendor='postgresql')
+        database.cursor.return_value = cursor
+        with mock.patch('api.pagination.connection', database):
+            self.assertEqual(estimate_count(Recipe.objects.all()), 50000)
+            self.assertEqual(get_cached_count(Recipe.objects.all()), 50000)
+            self.assertIsNone(
+                estimate_count(Recipe.objects.filter(author=self.author))
+            )
+            cursor.__enter__.return_value.fetchone.return_value = (100.0, )
+            self.assertIsNone(estimate_count(Recipe.objects.all()))
+        self.assertIsNone(estimate_count(Recipe.objects.all()))
+
+
+class SubscriptionsQueryTests(APITestBase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = [create_user(index) for index in range(2, 8)]
+        for author_index, author in enumerate(cls.authors):
+            for index in range(author_index + 1):
+                create_recipe(author, cls.tags[:1], cls.ingredients[:2], index)
+
+    def get_subscriptions(self, authors, recipes_limit):
+        Follow.objects.filter(follower=self.user).delete()
+        Follow.objects.bulk_create(
+            Follow(follower=self.user, author=author) for author in authors
+        )
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                '/api/users/subscriptions/'
+                f'?limit=10&recipes_limit={recipes_limit}'
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()['results']
+
+    def test_query_count_does_not_grow_with_authors(self):
+        few, _ = self.get_subscriptions(self.authors[:1], 2)
+        many, results = self.get_subscriptions(self.authors, 2)
+        self.assertEqual(len(results), len(self.authors))
+        self.assertEqual(few, many)
+
+    def test_recipes_limit(self):
+        _, results = self.get_subscriptions(self.authors, 2)
+        for result in results:
+            author = User.objects.get(pk=result['id'])
+            with self.subTest(author=author.username):
+                self.assertEqual(len(result['recipes']), min(
+                    author.recipes.count(), 2
+                ))
+                self.assertEqual(
+                    result['recipes_count'], author.recipes.count()
+                )
+
+
+class RecipeEditTests(APITestBase):
+    def get_payload(self, ingredients):
+        return {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in ingredients
+            ],
+            'tags': [self.tags[0].id],
+            'image': get_image_data(),
+            'name': 'Recipe',
+            'text': 'Text',
+            'cooking_time': 10,
+        }
+
+    def test_repeated_ingredients_are_added_up(self):
+        self.client.force_authenticate(self.author)
+        ingredient = self.ingredients[0]
+        response = self.client.post(
+            '/api/recipes/',
+            self.get_payload([(ingredient, 5000), (ingredient, 5000)]),
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [
+                (item['id'], item['amount'])
+                for item in response.json()['ingredients']
+            ],
+            [(ingredient.id, 10000)],
+        )
+
+    def test_total_amount_is_validated(self):
+        self.client.force_authenticate(self.author)
+        ingredient = self.ingredients[0]
+        response = self.client.post(
+            '/api/recipes/',
+            self.get_payload([(ingredient, 10000)] * 4),
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+        self.assertFalse(Recipe.objects.filter(author=self.author).exists())
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    SHOPPING_LIST_JOB_EXECUTOR='sync',
+    RECIPE_IMAGE_MAX_SIZE=400,
+    RECIPE_IMAGE_CARD_SIZE=200,
+    RECIPE_IMAGE_THUMBNAIL_SIZE=50,
+)
+class RecipeImageTests(APITransactionTestCase):
+    """Uploaded photos are capped, stripped and get their variants.
+
+    Variants are made once the recipe is committed, so this runs outside
+    a test transaction.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        patcher = mock.patch('api.jobs._executor', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_authenticate(create_user(0))
+        self.ingredient = Ingredient.objects.create(
+            name='Ingredient', measurement_unit='g'
+        )
+        self.tag = Tag.objects.create(name='Tag', slug='tag', color='#000000')
+
+    def test_oversized_photo_with_exif(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        # Rotated a quarter turn, so the stored photo is portrait.
+        exif[0x0112] = 6
+        # Photos with transparency are stored as PNG, which would keep
+        # the EXIF of the decoded image.
+        for image_format, mode in (('JPEG', 'RGB'), ('PNG', 'RGBA')):
+            response = self.client.post(
+                '/api/recipes/',
+                {
+                    'ingredients': [{'id': self.ingredient.id, 'amount': 10}],
+                    'tags': [self.tag.id],
+                    'image': get_image_data(
+                        (1200, 800), image_format, mode, exif=exif.tobytes()
+                    ),
+                    'name': image_format,
+                    'text': 'Text',
+                    'cooking_time': 10,
+                },
+                format='json',
+            )
+            self.assertEqual(response.status_code, 201)
+            recipe = Recipe.objects.get(name=image_format)
+            for field, size in (
+                    ('image', (267, 400)),
+                    ('image_card', (133, 200)),
+                    ('image_thumbnail', (33, 50)),
+            ):
+                with self.subTest(format=image_format, field=field), \
+                        getattr(recipe, field).open() as file, \
+                        Image.open(file) as image:
+                    self.assertEqual(image.size, size)
+                    self.assertFalse(image.getexif())
+                    self.assertNotIn('exif', image.info)
+
+
+class FavoritesOrderingCacheTests(APITransactionTestCase):
+    """Cached anonymous lists follow counter changes.
+
+    Caches are invalidated on commit, so this runs outside a test
+    transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user(0)
+        self.users = [create_user(index) for index in range(1, 4)]
+        self.recipes = [
+            create_recipe(self.author, [], [], index) for index in range(3)
+        ]
+        self.recipes[2].favorite.add(self.users[0])
+
+    def get_ids(self):
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/recipes/?ordering=-favorites_count')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_favorites_change_the_cached_order(self):
+        self.assertEqual(self.get_ids()[0], self.recipes[2].id)
+        for user in self.users:
+            self.client.force_authenticate(user)
+            response = self.client.post(
+                f'/api/recipes/{self.recipes[0].id}/favorite/'
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_ids()[0], self.recipes[0].id)
+
+    def test_clicks_keep_other_cached_responses(self):
+        urls = ['/api/recipes/', f'/api/recipes/{self.recipes[0].id}/']
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_authenticate(self.users[1])
+        for action in ('favorite', 'shopping_cart'):
+            response = self.client.post(
+                f'/api/recipes/{self.recipes[0].id}/{action}/'
+            )
+            self.assertEqual(response.status_code, 201)
+        self.client.force_authenticate(None)
+        for url in urls:
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    data = {
+        'decimal': Decimal('12.50'),
+        'datetime': datetime(2023, 2, 17, 12, 34, 56, 789000, timezone.utc),
+        'naive': datetime(2023, 2, 17, 12, 34, 56),
+        'date': date(2023, 2, 17),
+        'uuid': UUID('12345678-1234-5678-1234-567812345678'),
+        'lazy': gettext_lazy('Recipe'),
+        'text': 'Соль\u2028перец',
+        'list': [1, 2.5, None, True],
+        1: 'integer key',
+    }
+
+    def test_output_matches_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        for module in (orjson, None):
+            with self.subTest(orjson=module is not None), \
+                    mock.patch('api.renderers.orjson', module):
+                self.assertEqual(
+                    FastJSONRenderer().render(self.data), expected
+                )
+
+
+class ShoppingListPDFTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        # The shipped font is not part of the repository.
+        for patcher in (
+                mock.patch('api.pdf.register_font'),
+                mock.patch('api.pdf.FONT_NAME', 'Courier'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Item {index:03}', measurement_unit='g')
+            for index in range(100)
+        )
+        recipe = create_recipe(
+            self.author, [], Ingredient.objects.filter(name__startswith='Item')
+        )
+        Cart.objects.create(user=self.user).recipes.add(recipe)
+        self.client.force_authenticate(self.user)
+
+    def test_pages_are_sent_with_content_length(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/',
+            HTTP_ACCEPT='application/pdf',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertFalse(response.streaming)
+        self.assertEqual(
+            int(response['Content-Length']), len(response.content)
+        )
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        # 100 lines do not fit on two pages.
+        self.assertEqual(
+            len(re.findall(rb'/Type /Page\b', response.content)), 3
+        )
+
+
+@override_settings(RECIPE_RESPONSE_CACHE_TIMEOUT=300)
+class ResponseCacheTests(APITransactionTestCase):
+    """Anonymous responses are cached until a commit changes them.
+
+    Caches are invalidated on commit, so this runs outside a test
+    transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.tag = Tag.objects.create(name='Tag', slug='tag', color='#000000')
+        self.user = create_user(1)
+        self.recipe = create_recipe(create_user(0), [self.tag], [])
+        self.recipe.favorite.add(self.user)
+        self.urls = ['/api/recipes/', f'/api/recipes/{self.recipe.id}/']
+
+    def get(self, url, user=None, **headers):
+        client = self.client
+        if user is not None:
+            client = APIClient()
+            client.force_authenticate(user)
+        return client.get(url, **headers)
+
+    def get_recipe(self, url):
+        data = self.get(url).json()
+        return data['results'][0] if 'results' in data else data
+
+    def test_etag(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                with self.assertNumQueries(0):
+                    response = self.get(url, HTTP_IF_NONE_MATCH='"other"')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_authenticated_responses_are_not_cached(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.get(url, self.user)
+                with CaptureQueriesContext(connection) as context:
+                    anonymous = self.get(url)
+                self.assertTrue(context.captured_queries)
+                with CaptureQueriesContext(connection) as context:
+                    response = self.get(url, self.user)
+                self.assertTrue(context.captured_queries)
+                self.assertNotEqual(response.content, anonymous.content)
+                self.assertNotIn('ETag', response)
+
+    def test_recipe_change_invalidates_cached_responses(self):
+        for url in self.urls:
+            self.get(url)
+        self.recipe.name = 'Renamed'
+        self.recipe.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.get_recipe(url)['name'], 'Renamed')
+
+    def test_tag_change_invalidates_cached_responses(self):
+        for url in self.urls:
+            self.get(url)
+        self.tag.name = 'Retagged'
+        self.tag.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.get_recipe(url)['tags'][0]['name'], 'Retagged'
+                )
+
+
+@override_settings(MEMBERSHIP_CACHE_TIMEOUT=300)
+class MembershipCacheTests(APITransactionTestCase):
+    """Cached membership sets are invalidated once the write commits."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user(0)
+        self.user = create_user(1)
+        self.recipe = create_recipe(self.author, [], [])
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def get_recipe(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_favorite_toggle_is_read_back(self):
+        self.assertFalse(self.get_recipe()['is_favorited'])
+        for method, status, favorited in (
+                (self.client.post, 201, True),
+                (self.client.delete, 200, False),
+        ):
+            with self.subTest(favorited=favorited):
+                self.assertEqual(
+                    method(f'{self.url}favorite/').status_code, status
+                )
+                self.assertEqual(
+                    self.get_recipe()['is_favorited'], favorited
+                )
+
+    def test_subscription_is_read_back(self):
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assertFalse(self.get_recipe()['author']['is_subscribed'])
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertTrue(self.get_recipe()['author']['is_subscribed'])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(self.get_recipe()['author']['is_subscribed'])
+
+    def test_invalidated_after_commit(self):
+        # A reader invalidated before the commit could cache the old set.
+        in_transaction = []
+        invalidate = Membership.invalidate
+
+        def record(membership):
+            in_transaction.append(connection.in_atomic_block)
+            invalidate(membership)
+
+        with mock.patch.object(Membership, 'invalidate', record):
+            for action in ('favorite', 'shopping_cart'):
+                self.client.post(f'{self.url}{action}/')
+                self.client.delete(f'{self.url}{action}/')
+        self.assertEqual(in_transaction, [False] * 4)
+
+
+class ColdCacheClient(APIClient):
+    """Every request starts with empty caches."""
+
+    def request(self, **kwargs):
+        cache.clear()
+        caches['tokens'].clear()
+        return super().request(**kwargs)
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    QUERY_BUDGET_MODE='raise',
+    SHOPPING_LIST_JOB_EXECUTOR='sync',
+    SHOPPING_LIST_JOB_ROOT=JOB_ROOT,
+)
+class QueryBudgetTests(APITransactionTestCase):
+    """The heaviest paths of each endpoint stay within its budget.
+
+    Requests authenticate by token and miss every cache. Jobs run inline
+    and on commit, so this runs outside a test transaction.
+    """
+    client_class = ColdCacheClient
+
+    def setUp(self):
+        patcher = mock.patch('api.jobs._executor', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tags = [
+            Tag.objects.create(
+                name=f'Tag {index}',
+                slug=f'tag{index}',
+                color=f'#00000{index}',
+            )
+            for index in range(3)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ingredient {index}',
+                measurement_unit='g',
+            )
+            for index in range(5)
+        ]
+        self.author = create_user(0)
+        self.user = create_user(1)
+        self.recipe = create_recipe(
+            self.author, self.tags[:2], self.ingredients[:3]
+        )
+        self.recipe.favorite.add(self.user)
+        Cart.objects.create(user=self.user).recipes.add(self.recipe)
+        self.authenticate(self.author)
+
+    def authenticate(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_exceeded_budget_raises(self):
+        with mock.patch.object(TagViewSet, 'query_budgets', {'list': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/tags/')
+
+    def test_create(self):
+        response = self.client.post('/api/recipes/', {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients
+            ],
+            'tags': [tag.id for tag in self.tags],
+            'image': get_image_data(),
+            'name': 'Recipe',
+            'text': 'Text',
+            'cooking_time': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(response.json()['image_thumbnail'])
+
+    def test_update_everything(self):
+        response = self.client.patch(f'/api/recipes/{self.recipe.id}/', {
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 20},
+                {'id': self.ingredients[3].id, 'amount': 10},
+                {'id': self.ingredients[4].id, 'amount': 10},
+            ],
+            'tags': [self.tags[1].id, self.tags[2].id],
+            'image': get_image_data(),
+            'name': 'New name',
+            'text': 'New text',
+            'cooking_time': 20,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image_thumbnail)
+
+    def test_destroy(self):
+        response = self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_read_with_every_filter(self):
+        self.authenticate(self.user)
+        for author in (self.author, create_user(2)):
+            Follow.objects.create(follower=self.user, author=author)
+        for index in range(3):
+            recipe = create_recipe(self.author, self.tags, [], index + 1)
+            recipe.favorite.add(self.user)
+            self.user.cart.recipes.add(recipe)
+        url = (
+            '/api/recipes/?limit=2&is_favorited=1&is_in_shopping_cart=1'
+            f'&author={self.author.id}&tags=tag0&tags=tag1'
+            '&ordering=-favorites_count'
+        )
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            url = response.json()['next']
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            '/api/users/subscriptions/?limit=1&recipes_limit=1'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_favorite(self):
+        self.authenticate(self.user)
+        recipe = create_recipe(self.author, self.tags, self.ingredients, 1)
+        url = f'/api/recipes/{recipe.id}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.delete(url).status_code, 200)
+
+    def test_shopping_cart_of_new_user(self):
+        self.authenticate(create_user(2))
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.delete(url).status_code, 200)
+
+    def test_subscription(self):
+        self.authenticate(self.user)
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+
+    @mock.patch('api.jobs.get_pdf', return_value=b'%PDF-1.4')
+    def test_shopping_list_job(self, get_pdf):
+        self.authenticate(self.user)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?mode=job',
+            HTTP_ACCEPT='application/pdf',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'done')
+        job_url = (
+            f'/api/recipes/download_shopping_cart/{response.json()["id"]}/'
+        )
+        self.assertEqual(self.client.get(job_url).status_code, 200)
+        self.assertEqual(self.client.get(f'{job_url}file/').status_code, 200)
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    SHOPPING_LIST_JOB_EXECUTOR='sync',
+    SHOPPING_LIST_JOB_ROOT=JOB_ROOT,
+)
+class ShoppingListJobTests(APITransactionTestCase):
+    """Jobs outlive the cache and their files are private.
+
+    A cache miss stands in for a poll answered by another worker.
+    """
+    client_class = ColdCacheClient
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(JOB_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        for patcher in (
+            mock.patch('api.jobs._executor', None),
+            mock.patch('api.jobs.get_pdf', return_value=b'%PDF-1.4'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = create_user(0)
+        recipe = create_recipe(self.user, [], [
+            Ingredient.objects.create(name='Ingredient', measurement_unit='g')
+        ])
+        Cart.objects.create(user=self.user).recipes.add(recipe)
+        self.client.force_authenticate(self.user)
+        self.job_id = self.submit()
+        self.job_url = f'/api/recipes/download_shopping_cart/{self.job_id}/'
+
+    def submit(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?mode=job',
+            HTTP_ACCEPT='application/pdf',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['id']
+
+    def test_poll_after_cache_miss(self):
+        response = self.client.get(self.job_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'done')
+        self.assertEqual(
+            response.json()['file'], f'http://testserver{self.job_url}file/'
+        )
+
+    def test_file_is_served_to_owner_only(self):
+        response = self.client.get(f'{self.job_url}file/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4')
+        self.assertFalse([
+            name
+            for _, _, names in os.walk(MEDIA_ROOT)
+            for name in names
+            if name.endswith('.pdf')
+        ])
+        self.client.force_authenticate(create_user(1))
+        self.assertEqual(self.client.get(self.job_url).status_code, 404)
+        self.assertEqual(
+            self.client.get(f'{self.job_url}file/').status_code, 404
+        )
+
+    def test_old_jobs_are_deleted(self):
+        storage = get_storage()
+        other = create_user(1)
+        for job_id, hours in (('expired', 25), ('recent', 1)):
+            ShoppingListJob.objects.create(
+                id=job_id, user=other, status=ShoppingListJob.STATUS_DONE
+            )
+            ShoppingListJob.objects.filter(pk=job_id).update(
+                updated=timezone.now() - timedelta(hours=hours)
+            )
+            storage.save(get_job_path(job_id), ContentFile(b'%PDF-1.4'))
+        Cart.objects.get(user=self.user).recipes.add(
+            create_recipe(self.user, [], [Ingredient.objects.get()], 1)
+        )
+        job_id = self.submit()
+        self.assertNotEqual(job_id, self.job_id)
+        # The new list replaces the user's previous one.
+        self.assertEqual(
+            set(ShoppingListJob.objects.values_list('id', flat=True)),
+            {job_id, 'recent'},
+        )
+        for old_id, exists in (
+                (self.job_id, False),
+                ('expired', False),
+                ('recent', True),
+                (job_id, True),
+        ):
+            with self.subTest(job=old_id):
+                self.assertEqual(
+                    storage.exists(get_job_path(old_id)), exists
+                )
+
+
+@override_settings(TOKEN_CACHE_TIMEOUT=300, TOKEN_LOCAL_CACHE_TIMEOUT=10)
+class TokenCacheTests(APITransactionTestCase):
+    """Cached tokens stop working as soon as they are revoked.
+
+    Caches are invalidated on commit, so this runs outside a test
+    transaction.
+    """
+    url = '/api/users/subscriptions/'
+
+    def setUp(self):
+        cache.clear()
+        caches['tokens'].clear()
+        self.user = create_user(0)
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        self.token = Token.objects.create(user=user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def count_token_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len([
+            query for query in context.captured_queries
+            if 'authtoken_token' in query['sql']
+        ])
+
+    def assert_revoked_by(self, revoke):
+        # Cached in both tiers first.
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        revoke()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertIsNone(cache.get(get_cache_key(self.token.key)))
+
+    def test_cache_hit(self):
+        self.assertEqual(self.count_token_queries(), 1)
+        self.assertEqual(self.count_token_queries(), 0)
+        # A worker without the token in its local tier finds it shared.
+        caches['tokens'].clear()
+        self.assertEqual(self.count_token_queries(), 0)
+
+    def test_logout(self):
+        self.assert_revoked_by(lambda: self.assertEqual(
+            self.client.post('/api/auth/token/logout/').status_code, 204
+        ))
+
+    def test_user_deleted(self):
+        self.assert_revoked_by(self.user.delete)
+
+    def test_user_deactivated(self):
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+
+        self.assert_revoked_by(deactivate)
+
+    def test_inactive_user_is_rejected(self):
+        user = create_user(1)
+        user.is_active = False
+        user.save()
+        self.authenticate(user)
+        for _ in range(2):
+            self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertIsNone(cache.get(get_cache_key(self.token.key)))
+
+    def test_shared_tier_needs_a_shared_cache(self):
+        self.assertEqual(
+            [error.id for error in check_token_cache(None)], ['api.E001']
+        )
+        with override_settings(PROCESS_LOCAL_CACHES=()):
+            self.assertEqual(check_token_cache(None), [])
+        with override_settings(TOKEN_CACHE_TIMEOUT=0):
+            self.assertEqual(check_token_cache(None), [])
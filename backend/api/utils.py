@@ -1,52 +1,51 @@
-import io
+from django.db.models import F, Sum, Window
+from django.db.models.functions import RowNumber
 
-from django.http import FileResponse
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from recipes.models import Cart, RecipeIngredients
 
 
-def generate_pdf(title, ingredient_list, filename):
-    MIN_ADDITION_SPACES = 3
-
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, bottomup=0)
-    pdfmetrics.registerFont(TTFont('Russian', 'RobotoMono-Regular.ttf'))
-
-    p.setFont('Russian', 16)
-    p.drawString(60, 50, title.encode('utf-8'))
-    p.line(60, 55, 530, 55)
-
-    p.setFont('Russian', 12)
-    text_object = p.beginText(60, 80)
-    max_line_length = 0
-    for name, volume in ingredient_list:
-        max_line_length = max(
-            max_line_length,
-            len(f'{name}{volume}') + MIN_ADDITION_SPACES
+def generate_ingredient_list(user):
+    ingredients = (
+        RecipeIngredients.objects
+        .filter(
+            recipe_id__in=Cart.recipes.through.objects.filter(
+                cart__user_id=user.id
+            ).values('recipe_id')
         )
-    for name, volume in ingredient_list:
-        additional_spaces = max_line_length - len(f'{name}{volume}')
-        text_object.textLine(
-            f'{chr(2610)} {name}:{"_" * additional_spaces}{volume}'
-            .encode('utf-8')
+        .values('ingredient__name', 'ingredient__measurement_unit')
+        .annotate(total_amount=Sum('amount'))
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+    return [
+        (
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['total_amount'],
         )
-    p.drawText(text_object)
-
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename=filename)
-
-
-def generate_ingredient_list(user):
-    recipes = user.cart.recipes.all()
-
-    ingredient_list = {}
-    for recipe in recipes:
-        for ingredient in recipe.ingredients.select_related('ingredient'):
-            ingredient_list[str(ingredient.ingredient)] = (
-                ingredient_list.get(str(ingredient.ingredient), 0)
-                + ingredient.amount)
-
-    return sorted(ingredient_list.items())
+        for ingredient in ingredients
+    ]
+
+
+def limit_recipes_per_author(recipes, limit):
+    """Keep only the first `limit` recipes of every author.
+
+    Rows are numbered with ROW_NUMBER() partitioned by author in a single
+    query, so the result can be used as one prefetch for a whole page of
+    authors.
+    """
+    numbered = recipes.annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        )
+    ).order_by().values('id', 'row_number')
+    sql, params = numbered.query.sql_with_params()
+    return recipes.model.objects.extra(
+        where=[
+            f'{recipes.model._meta.db_table}.id IN ('
+            f'SELECT numbered.id FROM ({sql}) numbered '
+            f'WHERE numbered.row_number <= %s)'
+        ],
+        params=(*params, limit),
+    )
@@ -1,15 +1,37 @@
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Count, Prefetch
 from rest_framework import (
     viewsets, status, mixins, serializers
 )
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from api.cache import AnonymousResponseCacheMixin
+from api.fast import (
+    FastTagSerializer,
+    FastIngredientSerializer,
+    FastRecipeSerializer,
+    FastSubscriptionsSerializer,
+)
+from api.filters import RecipeFilterBackend
+from api.jobs import STATUS_DONE, get_job, open_job_file, submit_pdf_job
+from api.membership import get_membership
+from api.pagination import KeysetPagination, SubscriptionsKeysetPagination
 from api.permissions import (
     IsAuthorAdminOrReadOnly,
 )
+from api.renderers import (
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+)
 from api.serializers import (
     TagSerializer,
     RecipeViewSerializer,
@@ -18,41 +40,99 @@ from api.serializers import (
     SubscriptionsViewSerializer,
     SubscriptionSerializer,
     IngredientSerializer,
+    ShoppingListJobSerializer,
+)
+from api.utils import (
+    generate_ingredient_list,
+    limit_recipes_per_author,
 )
-from api.utils import generate_pdf, generate_ingredient_list
 from recipes.models import (
     Tag,
     Recipe,
     Ingredient,
     Cart,
 )
+from backend.metrics import SerializerTimingMixin
+from recipes.index import get_ingredient_index
+from recipes.search import search_ingredients
 from users.models import User, Follow
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class FastReadSerializerMixin:
+    """Serve list and retrieve with fast_serializer_class when enabled."""
+    fast_serializer_class = None
+
+    def get_serializer_class(self):
+        if (settings.FAST_READ_SERIALIZERS
+                and self.request.method == 'GET'
+                and self.action in ('list', 'retrieve')):
+            return self.fast_serializer_class
+        return super().get_serializer_class()
+
+
+class TagViewSet(SerializerTimingMixin,
+                 FastReadSerializerMixin,
+                 viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    fast_serializer_class = FastTagSerializer
     pagination_class = None
+    query_budgets = {'list': 2, 'retrieve': 2}
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(SerializerTimingMixin,
+                        FastReadSerializerMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    fast_serializer_class = FastIngredientSerializer
     pagination_class = None
+    query_budgets = {'list': 2, 'retrieve': 2}
 
     def get_queryset(self):
-        keyword = self.request.query_params.get('name', '')
-        queryset = Ingredient.objects.filter(
-            Q(name__istartswith=keyword) |
-            Q(name__contains=keyword)
+        keyword = self.request.query_params.get('name')
+        if self.action != 'list' or not keyword:
+            return Ingredient.objects.all()
+        return search_ingredients(
+            keyword,
+            limit=settings.INGREDIENT_SEARCH_LIMIT,
         )
-        return queryset
+
+    def list(self, request, *args, **kwargs):
+        keyword = request.query_params.get('name')
+        if settings.INGREDIENT_INDEX_ENABLED and keyword:
+            return HttpResponse(
+                get_ingredient_index().search_json(
+                    keyword,
+                    limit=settings.INGREDIENT_SEARCH_LIMIT,
+                ),
+                content_type='application/json',
+            )
+        return super().list(request, *args, **kwargs)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin,
+                    SerializerTimingMixin,
+                    FastReadSerializerMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeViewSerializer
+    fast_serializer_class = FastRecipeSerializer
+    pagination_class = KeysetPagination
+    filter_backends = (RecipeFilterBackend, )
     http_method_names = ['get', 'post', 'patch', 'delete', ]
+    query_budgets = {
+        'list': 8,
+        'retrieve': 7,
+        'create': 16,
+        'partial_update': 22,
+        'destroy': 12,
+        'favorite': 7,
+        'shopping_cart': 9,
+        'download_shopping_cart': 7,
+        'download_shopping_cart_job': 2,
+        'download_shopping_cart_file': 2,
+    }
 
     def get_permissions(self):
         if self.action == ('list', 'retrieve', 'create'):
@@ -62,59 +142,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH'):
             return RecipeEditSerializer
-        return RecipeViewSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
-        queryset = (
-            Recipe.objects
-            .select_related('author')
-            .prefetch_related('tags', 'ingredients')
-        )
-
-        author_id = self.request.query_params.get('author')
-        if author_id is not None:
-            author = get_object_or_404(User, id=author_id)
-            queryset = (
-                author.recipes
-                .prefetch_related('tags', 'ingredients')
-            )
-
-        is_favorited = self.request.query_params.get('is_favorited')
-        if is_favorited:
-            queryset = (
-                self.request.user.favorite_recipes
-                .prefetch_related('tags', 'ingredients')
-            )
-
-        is_in_shopping_cart = (
-            self.request.query_params
-            .get('is_in_shopping_cart')
-        )
-        if is_in_shopping_cart:
-            try:
-                queryset = (
-                    self.request.user.cart.recipes
-                    .prefetch_related('tags', 'ingredients')
-                )
-            except User.cart.RelatedObjectDoesNotExist:
-                queryset = Cart.objects.none()
-
-        tags = self.request.query_params.getlist('tags')
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
-
-        return queryset
+        return Recipe.objects.select_related('author')
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (isinstance(response, Response)
+                and self.action in (
+                    'download_shopping_cart', 'download_shopping_cart_file'
+                )):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
 
         response_serializer = RecipeViewSerializer(
-            instance=serializer.instance,
+            instance=self.get_queryset().get(pk=serializer.instance.pk),
             context={'request': request}
         )
         headers = self.get_success_headers(response_serializer.data)
@@ -140,16 +191,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
             instance._prefetched_objects_cache = {}
 
         response_serializer = RecipeViewSerializer(
-            instance=serializer.instance,
+            instance=self.get_queryset().get(pk=serializer.instance.pk),
             context={'request': request}
         )
         return Response(response_serializer.data)
 
+    @transaction.atomic
     def edit_cart_or_favorite(self, request, recipe_id, obj):
         recipe = get_object_or_404(Recipe, pk=recipe_id)
 
         if request.method == 'POST':
             obj.add(recipe)
+            transaction.on_commit(get_membership(request).invalidate)
             return Response(
                 ShortRecipeSerializer(
                     instance=recipe,
@@ -159,6 +212,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         if request.method == 'DELETE':
             obj.remove(recipe)
+            transaction.on_commit(get_membership(request).invalidate)
             return Response(
                 {},
                 status=status.HTTP_200_OK,
@@ -197,10 +251,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=['get'],
         detail=False,
         permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            PDFShoppingListRenderer,
+            TextShoppingListRenderer,
+            CSVShoppingListRenderer,
+            JSONShoppingListRenderer,
+        ],
     )
     def download_shopping_cart(self, request):
         if self.request.user.is_authenticated:
-            return generate_shopping_cart_pdf(self.request.user)
+            if (request.query_params.get('mode') == 'job'
+                    and isinstance(
+                        request.accepted_renderer, PDFShoppingListRenderer
+                    )):
+                return self.submit_shopping_cart_job(request)
+            return generate_shopping_cart_file(
+                self.request.user,
+                request.accepted_renderer,
+            )
         return Response(
             {
                 "detail": "Authentication credentials were not provided."
@@ -208,27 +276,117 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_401_UNAUTHORIZED,
         )
 
+    def submit_shopping_cart_job(self, request):
+        job = submit_pdf_job(
+            user=request.user,
+            title=get_shopping_cart_title(request.user),
+            ingredient_list=generate_ingredient_list(request.user),
+        )
+        return Response(
+            ShoppingListJobSerializer(
+                job,
+                context={'request': request},
+            ).data,
+            status=(
+                status.HTTP_200_OK if job.status == STATUS_DONE
+                else status.HTTP_202_ACCEPTED
+            ),
+        )
 
-class SubscriptionsListViewSet(mixins.ListModelMixin,
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{64})',
+    )
+    def download_shopping_cart_job(self, request, job_id):
+        job = get_job(job_id, self.request.user)
+        if job is None:
+            raise NotFound
+        return Response(
+            ShoppingListJobSerializer(
+                job,
+                context={'request': request},
+            ).data
+        )
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[PDFShoppingListRenderer, JSONRenderer],
+        url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{64})/file',
+    )
+    def download_shopping_cart_file(self, request, job_id):
+        job = get_job(job_id, self.request.user)
+        if job is None or job.status != STATUS_DONE:
+            raise NotFound
+        try:
+            file = open_job_file(job)
+        except FileNotFoundError:
+            raise NotFound
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=PDFShoppingListRenderer().get_filename('shopping_cart'),
+            content_type=PDFShoppingListRenderer.media_type,
+        )
+
+
+class SubscriptionsListViewSet(SerializerTimingMixin,
+                               FastReadSerializerMixin,
+                               mixins.ListModelMixin,
                                viewsets.GenericViewSet):
     queryset = User.objects.all()
     serializer_class = SubscriptionsViewSerializer
+    fast_serializer_class = FastSubscriptionsSerializer
     permission_classes = (IsAuthenticated, )
+    pagination_class = SubscriptionsKeysetPagination
+    query_budgets = {'list': 5}
 
     def get_queryset(self):
+        recipes = Recipe.objects.filter(
+            author__followers__follower=self.request.user
+        )
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = limit_recipes_per_author(recipes, recipes_limit)
         return (
             User.objects.filter(
                 followers__follower=self.request.user
             )
+            .annotate(
+                recipes_count=Count('recipes', distinct=True),
+            )
+            .prefetch_related(
+                Prefetch(
+                    'recipes',
+                    queryset=recipes,
+                    to_attr='limited_recipes',
+                )
+            )
         )
 
+    def get_recipes_limit(self):
+        try:
+            recipes_limit = int(
+                self.request.query_params.get('recipes_limit')
+            )
+        except (TypeError, ValueError):
+            return None
+        if recipes_limit < 0:
+            return None
+        return recipes_limit
+
 
-class SubscriptionViewSet(mixins.CreateModelMixin,
+class SubscriptionViewSet(SerializerTimingMixin,
+                          mixins.CreateModelMixin,
                           mixins.DestroyModelMixin,
                           viewsets.GenericViewSet):
     queryset = Follow.objects.all()
     serializer_class = SubscriptionSerializer
     permission_classes = (IsAuthenticated,)
+    query_budgets = {'create': 7, 'delete': 4}
 
     def get_object(self):
         return get_object_or_404(
@@ -239,6 +397,11 @@ class SubscriptionViewSet(mixins.CreateModelMixin,
 
     def perform_create(self, serializer):
         serializer.save(follower=self.request.user)
+        transaction.on_commit(get_membership(self.request).invalidate)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        transaction.on_commit(get_membership(self.request).invalidate)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(
@@ -262,9 +425,27 @@ class SubscriptionViewSet(mixins.CreateModelMixin,
         return self.destroy(request, *args, **kwargs)
 
 
-def generate_shopping_cart_pdf(user):
-    return generate_pdf(
-        title=f"{user.first_name}'s shopping cart",
-        ingredient_list=generate_ingredient_list(user),
-        filename='shopping_cart.pdf'
+def get_shopping_cart_title(user):
+    return f"{user.first_name}'s shopping cart"
+
+
+def generate_shopping_cart_file(user, renderer):
+    title = get_shopping_cart_title(user)
+    ingredient_list = generate_ingredient_list(user)
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    if renderer.streaming:
+        response = StreamingHttpResponse(
+            renderer.stream(title, ingredient_list),
+            content_type=content_type,
+        )
+    else:
+        response = HttpResponse(
+            renderer.render_file(title, ingredient_list),
+            content_type=content_type,
+        )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{renderer.get_filename("shopping_cart")}"'
     )
+    return response
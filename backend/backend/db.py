@@ -0,0 +1,66 @@
+"""Persistent database connection health checks.
+
+With CONN_MAX_AGE set, a worker keeps its connection between requests.
+Django 2.2 only drops it once it is too old or a query has failed, so a
+connection killed by a database restart or an idle timeout breaks the
+next request that uses it. For databases with CONN_HEALTH_CHECKS,
+ConnectionHealthMiddleware pings a reused connection at the start of
+a request and closes it if it no longer works, so the request
+reconnects instead. A connection is pinged at most once per
+CONN_HEALTH_CHECK_INTERVAL seconds, counted from its last ping or from
+when it was opened.
+"""
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def is_checked(settings_dict):
+    return bool(
+        settings_dict.get('CONN_HEALTH_CHECKS')
+        and settings_dict.get('CONN_MAX_AGE') != 0
+    )
+
+
+def is_due(connection, now):
+    checked_at = getattr(connection, 'health_checked_at', None)
+    return checked_at is None or now - checked_at >= (
+        connection.settings_dict.get('CONN_HEALTH_CHECK_INTERVAL', 0)
+    )
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    connection.health_checked_at = time.monotonic()
+
+
+def check_connections():
+    """Close open connections that no longer work."""
+    now = time.monotonic()
+    for alias in connections:
+        connection = connections[alias]
+        if (not is_checked(connection.settings_dict)
+                or connection.connection is None
+                or connection.in_atomic_block
+                or not is_due(connection, now)):
+            continue
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
+
+
+class ConnectionHealthMiddleware:
+    def __init__(self, get_response):
+        if not any(
+            is_checked(connections[alias].settings_dict)
+            for alias in connections
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        check_connections()
+        return self.get_response(request)
@@ -0,0 +1,389 @@
+"""Per-endpoint request metrics.
+
+MetricsMiddleware records the SQL query count, DB time, serializer time
+and render time of every request, keyed by the resolved view and action
+(e.g. ``RecipeViewSet.list``). They are returned in a Server-Timing
+header and aggregated into in-process histograms. Responses served from
+the anonymous response cache are labelled ``cache="hit"``, the ones that
+fill it ``cache="miss"``.
+
+Each worker process periodically writes its histograms to its own file
+in METRICS_DIR; ``metrics_view`` merges the files of all workers, so
+every scrape sees the same totals whichever gunicorn worker serves it.
+Files of workers that have exited are folded into one archive file.
+"""
+import contextvars
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Time spent handling the request.', DURATION_BUCKETS,
+    ),
+    'foodgram_db_queries': (
+        'SQL queries run per request.', QUERY_BUCKETS,
+    ),
+    'foodgram_db_duration_seconds': (
+        'Time spent running SQL queries.', DURATION_BUCKETS,
+    ),
+    'foodgram_serializer_duration_seconds': (
+        'Time from serializer construction to the view response.',
+        DURATION_BUCKETS,
+    ),
+    'foodgram_render_duration_seconds': (
+        'Time spent rendering the response.', DURATION_BUCKETS,
+    ),
+}
+
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = '.lock'
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Measurements of one request, also used as a DB execute wrapper."""
+
+    def __init__(self):
+        self.endpoint = 'unresolved'
+        self.cache = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_started = None
+        self.serializer_time = None
+        self.view_finished = None
+        self.render_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def rendered(self, response):
+        self.render_time = time.perf_counter() - self.view_finished
+
+    def get_labels(self):
+        labels = f'endpoint="{escape_label(self.endpoint)}"'
+        if self.cache is not None:
+            labels += f',cache="{self.cache}"'
+        return labels
+
+
+def escape_label(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+def get_pid(filename):
+    pid = filename.split('-', 1)[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(path, snapshot):
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def merge_snapshot(merged, snapshot):
+    for name, series in snapshot.items():
+        if name not in merged:
+            continue
+        for labels, counts in series.items():
+            total = merged[name].get(labels)
+            if total is None:
+                merged[name][labels] = counts
+            elif len(total) == len(counts):
+                merged[name][labels] = [
+                    a + b for a, b in zip(total, counts)
+                ]
+
+
+class Registry:
+    """Histograms of this process, by name and label set.
+
+    Each value holds per-bucket (not cumulative) counts, the +Inf bucket
+    last, followed by the sum of observations.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: {} for name in HISTOGRAMS}
+        self.path = None
+        self.flushed = 0.0
+
+    def observe(self, record, total):
+        observations = (
+            ('foodgram_request_duration_seconds', total),
+            ('foodgram_db_queries', record.queries),
+            ('foodgram_db_duration_seconds', record.db_time),
+            ('foodgram_serializer_duration_seconds', record.serializer_time),
+            ('foodgram_render_duration_seconds', record.render_time),
+        )
+        labels = record.get_labels()
+        with self.lock:
+            for name, value in observations:
+                if value is None:
+                    continue
+                buckets = HISTOGRAMS[name][1]
+                counts = self.values[name].setdefault(
+                    labels, [0] * (len(buckets) + 2)
+                )
+                index = 0
+                while index < len(buckets) and value > buckets[index]:
+                    index += 1
+                counts[index] += 1
+                counts[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: {
+                    labels: list(counts)
+                    for labels, counts in series.items()
+                }
+                for name, series in self.values.items()
+            }
+
+    def get_path(self):
+        if self.path is None or self.path[0] != os.getpid():
+            # A new pid means a forked worker: start from empty histograms.
+            if self.path is not None:
+                self.values = {name: {} for name in HISTOGRAMS}
+            self.path = (
+                os.getpid(),
+                os.path.join(
+                    settings.METRICS_DIR,
+                    f'{os.getpid()}-{time.time_ns()}.json',
+                ),
+            )
+        return self.path[1]
+
+    def flush(self, force=False):
+        """Write this process' histograms to METRICS_DIR if due."""
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        path = self.get_path()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        write_snapshot(path, self.snapshot())
+
+    def archive_dead(self):
+        """Fold the files of exited workers into the archive file.
+
+        Their totals are kept, so the merged counters never go back.
+        """
+        directory = settings.METRICS_DIR
+        with open(os.path.join(directory, LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = [
+                filename for filename in os.listdir(directory)
+                if filename.endswith('.json')
+                and get_pid(filename) not in (None, os.getpid())
+                and not is_alive(get_pid(filename))
+            ]
+            if not dead:
+                return
+            archive = os.path.join(directory, ARCHIVE_FILE)
+            merged = {name: {} for name in HISTOGRAMS}
+            for path in [archive] + [
+                os.path.join(directory, filename) for filename in dead
+            ]:
+                snapshot = read_snapshot(path)
+                if snapshot is not None:
+                    merge_snapshot(merged, snapshot)
+            write_snapshot(archive, merged)
+            for filename in dead:
+                os.remove(os.path.join(directory, filename))
+
+    def collect(self):
+        """Histograms of all worker processes, summed."""
+        if not settings.METRICS_DIR:
+            return self.snapshot()
+        self.flush(force=True)
+        self.archive_dead()
+        merged = {name: {} for name in HISTOGRAMS}
+        for filename in os.listdir(settings.METRICS_DIR):
+            if not filename.endswith('.json'):
+                continue
+            snapshot = read_snapshot(
+                os.path.join(settings.METRICS_DIR, filename)
+            )
+            if snapshot is not None:
+                merge_snapshot(merged, snapshot)
+        return merged
+
+
+registry = Registry()
+
+
+def get_endpoint(view_func, request):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+def start_serializer_timer():
+    record = _current.get()
+    if record is not None and record.serializer_started is None:
+        record.serializer_started = time.perf_counter()
+
+
+def stop_serializer_timer():
+    record = _current.get()
+    if record is not None and record.serializer_started is not None:
+        record.serializer_time = (
+            time.perf_counter() - record.serializer_started
+        )
+
+
+class SerializerTimingMixin:
+    """Report serializer time of a DRF view to MetricsMiddleware.
+
+    Measured from the first ``get_serializer()`` call to
+    ``finalize_response()``: validation, saving and ``.data``.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        start_serializer_timer()
+        return super().get_serializer(*args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        stop_serializer_timer()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def set_cache_result(result):
+    """Label the current request as a response cache hit or miss."""
+    record = _current.get()
+    if record is not None:
+        record.cache = result
+
+
+def render_response(response):
+    """Render a response inside the view, timed as render time."""
+    record = _current.get()
+    start = time.perf_counter()
+    response.render()
+    if record is not None:
+        record.render_time = time.perf_counter() - start
+    return response
+
+
+def format_server_timing(record, total):
+    metrics = [
+        f'db;desc="{record.queries} queries";'
+        f'dur={record.db_time * 1000:.1f}',
+    ]
+    if record.serializer_time is not None:
+        metrics.append(f'serializer;dur={record.serializer_time * 1000:.1f}')
+    if record.render_time is not None:
+        metrics.append(f'render;dur={record.render_time * 1000:.1f}')
+    if record.cache is not None:
+        metrics.append(f'cache;desc="{record.cache}"')
+    metrics.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(metrics)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record = RequestMetrics()
+        token = _current.set(record)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(record)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        registry.observe(record, total)
+        registry.flush()
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = format_server_timing(record, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        record = _current.get()
+        if record is not None:
+            record.endpoint = get_endpoint(view_func, request)
+
+    def process_template_response(self, request, response):
+        record = _current.get()
+        # Responses rendered by the view have timed their own rendering.
+        if record is not None and not response.is_rendered:
+            record.view_finished = time.perf_counter()
+            response.add_post_render_callback(record.rendered)
+        return response
+
+
+def format_metrics(histograms):
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, counts in sorted(histograms.get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), counts):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{name}_sum{{{labels}}} {counts[-1]}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(
+        format_metrics(registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,135 @@
+"""Per-endpoint SQL query budgets.
+
+Views declare the most queries each action may run in a
+``query_budgets`` class attribute, e.g. ``{'list': 8}``. Third-party
+views are budgeted in the QUERY_BUDGETS setting by endpoint name
+(``UserViewSet.me``). QueryBudgetMiddleware counts the queries of every
+request and, when a budget is exceeded, raises QueryBudgetExceeded
+(QUERY_BUDGET_MODE ``raise``, the default under ``manage.py test``) or
+logs a warning (``log``, the default with DEBUG). Both name the most
+repeated query and where it was run from. Queries of background jobs
+that run inline, in the request's thread, are left out of the count.
+"""
+import logging
+import re
+import threading
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from backend import metrics
+from backend.metrics import get_endpoint
+
+logger = logging.getLogger(__name__)
+
+MODE_OFF = 'off'
+MODE_LOG = 'log'
+MODE_RAISE = 'raise'
+PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+IGNORED_FILES = (__file__, metrics.__file__)
+
+_state = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_pattern(sql):
+    """The query with IN lists of any length collapsed."""
+    return PLACEHOLDERS.sub('%s, ...', sql)
+
+
+def get_project_stack():
+    """Frames of the current stack that belong to the project."""
+    return [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in frame.filename
+        and frame.filename not in IGNORED_FILES
+    ]
+
+
+@contextmanager
+def uncounted():
+    """Leave the queries run in the block out of the request's count."""
+    paused = getattr(_state, 'paused', False)
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = paused
+
+
+class QueryLog:
+    """Counts queries by pattern, keeping where each was first run."""
+
+    def __init__(self):
+        self.count = 0
+        self.patterns = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'paused', False):
+            return execute(sql, params, many, context)
+        self.count += 1
+        pattern = get_pattern(sql)
+        if pattern in self.patterns:
+            self.patterns[pattern][0] += 1
+        else:
+            self.patterns[pattern] = [1, get_project_stack()]
+        return execute(sql, params, many, context)
+
+    def report(self, endpoint, budget):
+        pattern, (count, stack) = max(
+            self.patterns.items(), key=lambda item: item[1][0]
+        )
+        origin = (
+            ''.join(traceback.format_list(stack)) if stack
+            else 'outside the project code\n'
+        )
+        return (
+            f'{endpoint} ran {self.count} queries, its budget is {budget}. '
+            f'Most repeated ({count} times): {pattern}\n'
+            f'First run from:\n{origin}'
+        )
+
+
+def get_budget(view_func, endpoint):
+    budgets = getattr(getattr(view_func, 'cls', None), 'query_budgets', {})
+    action = endpoint.rsplit('.', 1)[-1]
+    if action in budgets:
+        return budgets[action]
+    return settings.QUERY_BUDGETS.get(endpoint)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if settings.QUERY_BUDGET_MODE not in (MODE_LOG, MODE_RAISE):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        log = QueryLog()
+        request.query_budget = None
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(log))
+            response = self.get_response(request)
+        if request.query_budget is None:
+            return response
+        endpoint, budget = request.query_budget
+        if log.count > budget:
+            report = log.report(endpoint, budget)
+            if settings.QUERY_BUDGET_MODE == MODE_RAISE:
+                raise QueryBudgetExceeded(report)
+            logger.warning(report)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        endpoint = get_endpoint(view_func, request)
+        budget = get_budget(view_func, endpoint)
+        if budget is not None:
+            request.query_budget = (endpoint, budget)
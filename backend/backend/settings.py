@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -46,6 +48,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.db.ConnectionHealthMiddleware',
+    'backend.metrics.MetricsMiddleware',
+    'backend.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +85,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', default='60')
+DB_CONN_MAX_AGE = None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE)
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', default='False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
@@ -87,7 +96,23 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='password'),
         'HOST': os.getenv('DB_HOST', default='127.0.0.1'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        # Seconds to keep a connection between requests, 'None' for no
+        # limit and 0 to close it after every request.
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        # Ping reused connections before each request, see backend.db.
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True'
+        ),
+        # Seconds between two pings of the same connection, 0 for every
+        # request.
+        'CONN_HEALTH_CHECK_INTERVAL': int(
+            os.getenv('DB_CONN_HEALTH_CHECK_INTERVAL', default=10)
+        ),
+        # Behind pgbouncer in transaction pooling mode a cursor cannot
+        # outlive its transaction, so use client-side cursors only.
+        # psycopg2 does not keep prepared statements across transactions.
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 # DATABASES = {
@@ -98,6 +123,56 @@ DATABASES = {
 # }
 
 
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tokens',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('TOKEN_LOCAL_CACHE_SIZE', default=1000)
+            ),
+        },
+    },
+}
+
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_RESPONSE_CACHE_TIMEOUT', default=300)
+)
+
+RECIPE_PAYLOAD_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_PAYLOAD_CACHE_TIMEOUT', default=0)
+)
+MEMBERSHIP_CACHE_TIMEOUT = int(
+    os.getenv('MEMBERSHIP_CACHE_TIMEOUT', default=0)
+)
+# Logout reaches other workers through the default cache only if they
+# share it, so the shared token tier is off with a per-process backend.
+TOKEN_CACHE_TIMEOUT = int(os.getenv(
+    'TOKEN_CACHE_TIMEOUT',
+    default=(
+        0 if CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES else 300
+    ),
+))
+TOKEN_LOCAL_CACHE_TIMEOUT = int(
+    os.getenv('TOKEN_LOCAL_CACHE_TIMEOUT', default=10)
+)
+
+FAST_READ_SERIALIZERS = (
+    os.getenv('FAST_READ_SERIALIZERS', default='False') == 'True'
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -136,10 +211,25 @@ RESERVED_USERNAMES = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.LimitPagePagination',
     'PAGE_SIZE': 5,
+    'PAGINATION_COUNT_MODE': os.getenv(
+        'PAGINATION_COUNT_MODE', default='exact'
+    ),
+    'PAGINATION_COUNT_CACHE_TIMEOUT': int(
+        os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', default=60)
+    ),
 }
 
 
@@ -166,5 +256,86 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+SHOPPING_LIST_JOB_EXECUTOR = os.getenv(
+    'SHOPPING_LIST_JOB_EXECUTOR', default='thread'
+)
+SHOPPING_LIST_JOB_WORKERS = int(
+    os.getenv('SHOPPING_LIST_JOB_WORKERS', default=2)
+)
+# Rendered shopping lists are private: keep them out of MEDIA_ROOT.
+SHOPPING_LIST_JOB_ROOT = os.getenv(
+    'SHOPPING_LIST_JOB_ROOT',
+    default=os.path.join(BASE_DIR, 'private', 'shopping_lists'),
+)
+# Jobs and their files are deleted this many hours after the last change.
+SHOPPING_LIST_JOB_EXPIRE_HOURS = int(
+    os.getenv('SHOPPING_LIST_JOB_EXPIRE_HOURS', default=24)
+)
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=1600)
+)
+RECIPE_IMAGE_CARD_SIZE = int(
+    os.getenv('RECIPE_IMAGE_CARD_SIZE', default=600)
+)
+RECIPE_IMAGE_THUMBNAIL_SIZE = int(
+    os.getenv('RECIPE_IMAGE_THUMBNAIL_SIZE', default=200)
+)
+RECIPE_IMAGE_VARIANT_FORMAT = os.getenv(
+    'RECIPE_IMAGE_VARIANT_FORMAT', default='WEBP'
+)
+RECIPE_IMAGE_QUALITY = int(
+    os.getenv('RECIPE_IMAGE_QUALITY', default=80)
+)
+
+METRICS_DIR = os.getenv(
+    'METRICS_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram-metrics'),
+)
+METRICS_FLUSH_INTERVAL = float(
+    os.getenv('METRICS_FLUSH_INTERVAL', default=5)
+)
+METRICS_SERVER_TIMING = (
+    os.getenv('METRICS_SERVER_TIMING', default='True') == 'True'
+)
+
+# Queries allowed per request to third-party views, by endpoint name.
+# Views of the api app declare theirs in a query_budgets attribute.
+QUERY_BUDGET_MODE = os.getenv(
+    'QUERY_BUDGET_MODE',
+    default=(
+        'raise' if sys.argv[1:2] == ['test']
+        else 'log' if DEBUG
+        else 'off'
+    ),
+)
+QUERY_BUDGETS = {
+    'APIRootView.get': 0,
+    'UserViewSet.list': 4,
+    'UserViewSet.create': 4,
+    'UserViewSet.retrieve': 3,
+    'UserViewSet.update': 1,
+    'UserViewSet.partial_update': 1,
+    'UserViewSet.destroy': 26,
+    'UserViewSet.me': 26,
+    'UserViewSet.activation': 1,
+    'UserViewSet.resend_activation': 1,
+    'UserViewSet.set_password': 4,
+    'UserViewSet.reset_password': 1,
+    'UserViewSet.reset_password_confirm': 1,
+    'UserViewSet.set_username': 5,
+    'UserViewSet.reset_username': 1,
+    'UserViewSet.reset_username_confirm': 1,
+    'TokenCreateView.post': 5,
+    'TokenDestroyView.post': 4,
+}
+
+INGREDIENT_SEARCH_LIMIT = int(
+    os.getenv('INGREDIENT_SEARCH_LIMIT', default=20)
+)
+INGREDIENT_INDEX_ENABLED = (
+    os.getenv('INGREDIENT_INDEX_ENABLED', default='False') == 'True'
+)
+
 STANDARD_MAX_CHAR_FIELD_LENGTH = 150
 EMAIL_MAX_CHAR_FIELD_LENGTH = 254
@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from backend import metrics
+from backend.db import check_connections
+
+METRICS_DIR = tempfile.mkdtemp()
+# Above the kernel's pid_max, so never a running process.
+DEAD_PID = 2 ** 30
+
+
+@override_settings(METRICS_DIR=METRICS_DIR, RECIPE_RESPONSE_CACHE_TIMEOUT=300)
+class MetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        os.makedirs(METRICS_DIR)
+        patcher = mock.patch.object(metrics, 'registry', metrics.Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+    def test_cache_hits_are_labelled(self):
+        miss = self.client.get('/api/recipes/')
+        hit = self.client.get('/api/recipes/')
+        self.assertIn('cache;desc="miss"', miss['Server-Timing'])
+        self.assertIn('render;', miss['Server-Timing'])
+        self.assertIn('cache;desc="hit"', hit['Server-Timing'])
+        self.assertNotIn('render;', hit['Server-Timing'])
+        histograms = self.registry.collect()
+        labels = 'endpoint="RecipeViewSet.list",cache="{}"'
+        for result in ('hit', 'miss'):
+            self.assertEqual(
+                sum(histograms['foodgram_request_duration_seconds'][
+                    labels.format(result)
+                ][:-1]),
+                1,
+            )
+        self.assertEqual(
+            list(histograms['foodgram_render_duration_seconds']),
+            [labels.format('miss')],
+        )
+
+    def test_files_of_exited_workers_are_archived(self):
+        counts = [1] + [0] * len(metrics.DURATION_BUCKETS) + [0.001]
+        snapshot = {
+            'foodgram_request_duration_seconds': {'endpoint="dead"': counts},
+        }
+        for index in range(2):
+            path = os.path.join(METRICS_DIR, f'{DEAD_PID}-{index}.json')
+            with open(path, 'w') as file:
+                json.dump(snapshot, file)
+        for _ in range(2):
+            histograms = self.registry.collect()
+            self.assertEqual(
+                histograms['foodgram_request_duration_seconds'][
+                    'endpoint="dead"'
+                ][0],
+                2,
+            )
+        self.assertFalse([
+            filename for filename in os.listdir(METRICS_DIR)
+            if filename.startswith(str(DEAD_PID))
+        ])
+        self.assertIn(metrics.ARCHIVE_FILE, os.listdir(METRICS_DIR))
+
+
+class ConnectionHealthTests(SimpleTestCase):
+    def get_connection(self, interval, usable=True):
+        connection = mock.Mock(
+            spec=['settings_dict', 'connection', 'in_atomic_block',
+                  'is_usable', 'close'],
+            settings_dict={
+                'CONN_MAX_AGE': None,
+                'CONN_HEALTH_CHECKS': True,
+                'CONN_HEALTH_CHECK_INTERVAL': interval,
+            },
+            connection=object(),
+            in_atomic_block=False,
+        )
+        connection.is_usable.return_value = usable
+        return connection
+
+    def check_at(self, connection, *times):
+        with mock.patch('backend.db.connections', {'default': connection}):
+            for now in times:
+                with mock.patch('backend.db.time.monotonic', return_value=now):
+                    check_connections()
+
+    def test_pings_at_most_once_per_interval(self):
+        connection = self.get_connection(10)
+        self.check_at(connection, 100, 105, 109, 110, 115, 121)
+        self.assertEqual(connection.is_usable.call_count, 3)
+
+    def test_zero_interval_pings_every_request(self):
+        connection = self.get_connection(0)
+        self.check_at(connection, 100, 100, 101)
+        self.assertEqual(connection.is_usable.call_count, 3)
+
+    def test_broken_connection_is_closed(self):
+        connection = self.get_connection(10, usable=False)
+        self.check_at(connection, 100)
+        connection.close.assert_called_once_with()
@@ -18,10 +18,12 @@ from django.urls import path, include
 from django.conf.urls.static import static
 
 from backend import settings
+from backend.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
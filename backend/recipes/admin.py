@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from .models import (
     Recipe,
@@ -82,3 +84,24 @@ class CartAdmin(admin.ModelAdmin):
     )
     search_fields = ('user', )
     list_filter = ('user', 'recipes')
+    ordering = ('user', )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_in_cart=Coalesce(
+                Subquery(
+                    Cart.recipes.through.objects
+                    .filter(cart_id=OuterRef('pk'))
+                    .order_by()
+                    .values('cart_id')
+                    .annotate(total=Count('id'))
+                    .values('total'),
+                    output_field=IntegerField(),
+                ),
+                0,
+            )
+        )
+
+    def recipes_in_cart_count(self, obj):
+        return obj.recipes_in_cart
+    recipes_in_cart_count.admin_order_field = 'recipes_in_cart'
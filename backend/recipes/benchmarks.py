@@ -0,0 +1,140 @@
+"""Shared harness of the benchmark management commands.
+
+Commands time their calls with `Timings`, print one line per variant to
+stderr and write the results to stdout as JSON via `BenchmarkCommand`.
+"""
+import json
+import math
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from recipes.management.commands.seed_data import USERNAME_PREFIX
+from users.models import User
+
+# Scale from seconds, rounding and label of each unit.
+UNITS = {
+    'ms': (1000, 3, 'мс'),
+    'us': (1000000, 1, 'мкс'),
+}
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def get_user(username):
+    """The given user, or the first seeded one."""
+    users = User.objects.order_by('id')
+    if username:
+        users = users.filter(username=username)
+    else:
+        users = users.filter(username__startswith=USERNAME_PREFIX)
+    user = users.first()
+    if user is None:
+        raise CommandError(
+            'No user to benchmark with, run seed_data or pass --user.'
+        )
+    return user
+
+
+@contextmanager
+def test_environment():
+    """Let the test client and its renderers run outside of tests."""
+    setup_test_environment()
+    try:
+        yield
+    finally:
+        teardown_test_environment()
+
+
+class Timings:
+    """Wall and CPU time of the blocks run in ``with timings:``.
+
+    Queries of each block are counted too, unless `count_queries` is off:
+    counting opens the connection before the block starts.
+    """
+
+    def __init__(self, unit='ms', count_queries=True):
+        self.unit = unit
+        self.scale, self.digits, self.label = UNITS[unit]
+        self.count_queries = count_queries
+        self.values = []
+        self.queries = []
+        self.cpu_time = 0.0
+
+    def __enter__(self):
+        if self.count_queries:
+            self.context = CaptureQueriesContext(connection)
+            self.context.__enter__()
+        self.cpu_started = time.process_time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.started
+        self.cpu_time += time.process_time() - self.cpu_started
+        if self.count_queries:
+            self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.values.append(elapsed * self.scale)
+            if self.count_queries:
+                self.queries.append(len(self.context.captured_queries))
+
+    def round(self, value):
+        return round(value, self.digits)
+
+    @property
+    def queries_per_call(self):
+        return sum(self.queries) / len(self.queries)
+
+    def summary(self, cpu=False):
+        """Percentiles and mean, optionally the mean CPU time."""
+        summary = {
+            f'p50_{self.unit}': self.round(percentile(self.values, 50)),
+            f'p95_{self.unit}': self.round(percentile(self.values, 95)),
+            f'mean_{self.unit}': self.round(
+                sum(self.values) / len(self.values)
+            ),
+        }
+        if cpu:
+            summary[f'cpu_{self.unit}'] = self.round(
+                self.cpu_time / len(self.values) * self.scale
+            )
+        if self.count_queries:
+            summary['queries_per_request'] = self.queries_per_call
+        return summary
+
+    def describe(self):
+        """The summary as a line of progress output."""
+        parts = [
+            f'p50 {self.round(percentile(self.values, 50))} {self.label}',
+            f'p95 {self.round(percentile(self.values, 95))} {self.label}',
+        ]
+        if self.count_queries:
+            parts.append(f'{self.queries_per_call:g} запросов к БД')
+        return ', '.join(parts)
+
+
+class BenchmarkCommand(BaseCommand):
+    """Writes progress to stderr and the report to stdout as JSON."""
+
+    def write_progress(self, label, *details):
+        self.stderr.write(f'{label}: {", ".join(details)}')
+
+    def write_report(self, **report):
+        self.stdout.write(json.dumps(
+            {'database': connection.vendor, **report},
+            ensure_ascii=False,
+            indent=2,
+        ))
@@ -0,0 +1,45 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.events import counters_refreshed
+from recipes.models import Cart, Recipe
+
+COUNTERS = {
+    'favorites_count': Recipe.favorite.through,
+    'in_carts_count': Cart.recipes.through,
+}
+
+
+def count_subquery(through):
+    return Coalesce(
+        Subquery(
+            through.objects
+            .filter(recipe_id=OuterRef('pk'))
+            .order_by()
+            .values('recipe_id')
+            .annotate(total=Count('id'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def refresh_counters(recipe_ids=None, fields=None):
+    """Recount counters of the given recipes in one UPDATE.
+
+    All counters are recounted unless `fields` are given. The UPDATE sends
+    no model signals, so `counters_refreshed` is sent instead.
+    """
+    fields = list(COUNTERS) if fields is None else list(fields)
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        recipes = recipes.filter(id__in=recipe_ids)
+    updated = recipes.update(**{
+        field: count_subquery(COUNTERS[field]) for field in fields
+    })
+    counters_refreshed.send(
+        sender=Recipe, recipe_ids=recipe_ids, fields=fields
+    )
+    return updated
@@ -0,0 +1,12 @@
+"""Signals of writes that bypass the model signals.
+
+Apps that derive data from recipes, such as the api caches, connect
+receivers to drop what the write made stale.
+"""
+from django.dispatch import Signal
+
+# Sent by refresh_counters with `recipe_ids` (None for every recipe) and
+# the recounted `fields`.
+counters_refreshed = Signal()
+# Sent after recipes and their relations are written in bulk.
+recipes_bulk_written = Signal()
@@ -0,0 +1,144 @@
+import json
+import logging
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from recipes.models import Ingredient
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+VERSION_CACHE_KEY = 'ingredient_index_version'
+
+
+class IngredientIndex:
+    """In-memory ingredient catalogue for autocomplete.
+
+    Prefix lookups use bisect over names sorted in lower case, substring
+    lookups intersect a trigram map. Every entry keeps its JSON
+    representation, so responses are built without serializers.
+    """
+
+    def __init__(self, ingredients):
+        entries = sorted(
+            (name.lower(), len(name), name, pk, json.dumps(
+                {'id': pk, 'name': name, 'measurement_unit': unit},
+                ensure_ascii=False,
+                separators=(',', ':'),
+            ).encode('utf-8'))
+            for pk, name, unit in ingredients
+        )
+        self.keys = [entry[0] for entry in entries]
+        self.ranks = [(entry[1], entry[2]) for entry in entries]
+        self.payloads = [entry[4] for entry in entries]
+        self.ngrams = {}
+        for position, key in enumerate(self.keys):
+            for ngram in get_ngrams(key):
+                self.ngrams.setdefault(ngram, set()).add(position)
+
+    @classmethod
+    def from_db(cls):
+        return cls(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        )
+
+    def prefix_positions(self, keyword):
+        start = bisect_left(self.keys, keyword)
+        end = bisect_left(self.keys, keyword + '\uffff', lo=start)
+        return range(start, end)
+
+    def substring_positions(self, keyword):
+        if len(keyword) < NGRAM_SIZE:
+            return range(len(self.keys))
+        candidates = None
+        for ngram in get_ngrams(keyword):
+            positions = self.ngrams.get(ngram, set())
+            candidates = (
+                positions if candidates is None else candidates & positions
+            )
+            if not candidates:
+                return ()
+        return candidates
+
+    def search(self, keyword, limit=None):
+        """Return JSON payloads ranked like `search_ingredients`."""
+        keyword = keyword.lower()
+        prefix = set(self.prefix_positions(keyword))
+        substring = {
+            position for position in self.substring_positions(keyword)
+            if position not in prefix and keyword in self.keys[position]
+        }
+        ranked = (
+            sorted(prefix, key=self.ranks.__getitem__)
+            + sorted(substring, key=self.ranks.__getitem__)
+        )
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.payloads[position] for position in ranked]
+
+    def search_json(self, keyword, limit=None):
+        return b'[' + b','.join(self.search(keyword, limit)) + b']'
+
+
+def get_ngrams(value):
+    return {
+        value[start:start + NGRAM_SIZE]
+        for start in range(len(value) - NGRAM_SIZE + 1)
+    }
+
+
+_lock = threading.Lock()
+_index = None
+_version = None
+
+
+def get_version():
+    return cache.get_or_set(VERSION_CACHE_KEY, 1, None)
+
+
+def get_ingredient_index():
+    """Return the process-wide index, rebuilding it after invalidation."""
+    global _index, _version
+    version = get_version()
+    if _index is None or _version != version:
+        with _lock:
+            if _index is None or _version != version:
+                _index = IngredientIndex.from_db()
+                _version = version
+    return _index
+
+
+def invalidate_ingredient_index():
+    """Drop the index of this process and bump the version in the cache.
+
+    Other workers rebuild their index when they see the new version, so
+    they only do with a cache shared between processes. With a per-process
+    cache they keep serving the index they have until they restart.
+    """
+    global _index
+    _index = None
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
+
+
+def load_ingredient_index():
+    """Warm the index at worker startup, it is built lazily otherwise."""
+    if not settings.INGREDIENT_INDEX_ENABLED:
+        return
+    if (settings.CACHES['default']['BACKEND']
+            in settings.PROCESS_LOCAL_CACHES):
+        logger.warning(
+            'INGREDIENT_INDEX_ENABLED is set with a per-process cache '
+            'backend: ingredient changes reach other workers only after '
+            'they restart. Set CACHE_BACKEND to a shared cache.'
+        )
+    try:
+        get_ingredient_index()
+    except DatabaseError:
+        pass
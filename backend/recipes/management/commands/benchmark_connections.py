@@ -0,0 +1,81 @@
+from django.core.management.base import CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from backend.db import check_connections
+from recipes.benchmarks import BenchmarkCommand, Timings
+
+# Name, CONN_MAX_AGE, CONN_HEALTH_CHECKS and CONN_HEALTH_CHECK_INTERVAL.
+VARIANTS = (
+    ('connect_per_request', 0, False, 0),
+    ('persistent', None, False, 0),
+    ('persistent_health_checks', None, True, 0),
+    ('persistent_health_check_interval', None, True, 10),
+)
+SETTINGS = ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'CONN_HEALTH_CHECK_INTERVAL')
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Measure the per-request connection overhead of the default '
+        'database with and without persistent connections, as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Simulated requests per variant (default: 500).',
+        )
+
+    def measure(self, requests, health_checks):
+        """Time a request cycle running one query.
+
+        Request signals open and close the connection like they do for
+        a real request; the health check runs where the middleware would.
+        """
+        connects = []
+
+        def connected(sender, **kwargs):
+            connects.append(1)
+
+        connection_created.connect(connected)
+        # Counting queries would connect ahead of the timed block.
+        timings = Timings('us', count_queries=False)
+        try:
+            for _ in range(requests):
+                with timings:
+                    request_started.send(sender=self.__class__)
+                    if health_checks:
+                        check_connections()
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                    request_finished.send(sender=self.__class__)
+        finally:
+            connection_created.disconnect(connected)
+        return timings, len(connects)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+        settings_dict = connection.settings_dict
+        original = {key: settings_dict.get(key) for key in SETTINGS}
+        results = {}
+        try:
+            for name, *values in VARIANTS:
+                connection.close()
+                settings_dict.update(zip(SETTINGS, values))
+                health_checks = settings_dict['CONN_HEALTH_CHECKS']
+                timings, connects = self.measure(
+                    options['requests'], health_checks
+                )
+                results[name] = {**timings.summary(), 'connects': connects}
+                self.write_progress(
+                    name, timings.describe(), f'{connects} подключений'
+                )
+        finally:
+            connection.close()
+            settings_dict.update(original)
+        self.write_report(results=results)
@@ -0,0 +1,76 @@
+import json
+from urllib.parse import urlencode
+
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.benchmarks import BenchmarkCommand, Timings, test_environment
+from recipes.index import get_ingredient_index
+from recipes.models import Ingredient
+
+KEYWORDS = ('а', 'мо', 'сах', 'мука', 'оль', 'перец', 'сливочное')
+VARIANTS = (
+    ('database', False),
+    ('index', True),
+)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare ingredient autocomplete latency of the database search '
+        'and the in-memory index, as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Searches per keyword and variant (default: 200).',
+        )
+        parser.add_argument(
+            '--keywords',
+            nargs='+',
+            default=list(KEYWORDS),
+            help=f'Search terms (default: {" ".join(KEYWORDS)}).',
+        )
+
+    def measure(self, client, keywords, requests):
+        timings = Timings('us')
+        results = 0
+        for keyword in keywords:
+            url = f'/api/ingredients/?{urlencode({"name": keyword})}'
+            for _ in range(requests):
+                with timings:
+                    response = client.get(url)
+            results += len(json.loads(response.content))
+        return timings, round(results / len(keywords), 1)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+        if not Ingredient.objects.exists():
+            raise CommandError(
+                'No ingredients to search, run import_ingredients.'
+            )
+        get_ingredient_index()
+
+        results = {}
+        with test_environment():
+            client = APIClient()
+            for name, enabled in VARIANTS:
+                with override_settings(INGREDIENT_INDEX_ENABLED=enabled):
+                    timings, results_per_keyword = self.measure(
+                        client, options['keywords'], options['requests']
+                    )
+                results[name] = {
+                    **timings.summary(),
+                    'results_per_keyword': results_per_keyword,
+                }
+                self.write_progress(name, timings.describe())
+        self.write_report(
+            ingredients=Ingredient.objects.count(),
+            keywords=options['keywords'],
+            results=results,
+        )
@@ -1,48 +1,155 @@
 import csv
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from recipes.index import invalidate_ingredient_index
 from recipes.models import Ingredient
 
+DEFAULT_PATH = 'ingredients.csv'
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+FORMATS = ('csv', 'json')
+FIELDS = ('name', 'measurement_unit')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """Yield rows of a JSON array of objects without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON file must contain an array.')
+    buffer = buffer[1:]
+    index = 0
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError(
+                    f'JSON file is malformed at record {index}.'
+                )
+            buffer += chunk
+            continue
+        if (not isinstance(item, dict)
+                or not all(field in item for field in FIELDS)):
+            raise CommandError(
+                f'JSON record {index} must be an object with '
+                f'{" and ".join(FIELDS)} keys.'
+            )
+        yield item['name'], item['measurement_unit']
+        buffer = buffer[end:]
+        index += 1
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 
 class Command(BaseCommand):
+    help = 'Import ingredients from a CSV or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=DEFAULT_PATH,
+            help=f'Path to the file (default: {DEFAULT_PATH}).',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format, detected from the extension by default.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per INSERT (default: {DEFAULT_BATCH_SIZE}).',
+        )
+
     def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format']
+            or os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in FORMATS:
+            raise CommandError(
+                f'Unknown format "{file_format}", use --format.'
+            )
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
         try:
-            r_file = open('ingredients.csv', encoding='utf-8')
+            r_file = open(path, encoding='utf-8')
         except IOError as e:
-            self.stdout.write(self.style.ERROR(e))
-        else:
-            upload_list = {}
-            with r_file:
-                data = csv.DictReader(
-                    r_file,
-                    fieldnames=['name', 'unit']
-                )
-                for row in data:
-                    if not Ingredient.objects.filter(
-                            name=row['name'],
-                            measurement_unit=row['unit']
-                    ).exists():
-                        upload_list[str(
-                            Ingredient(
-                                name=row['name'],
-                                measurement_unit=row['unit']
-                            )
-                        )] = Ingredient(
-                            name=row['name'],
-                            measurement_unit=row['unit']
-                        )
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
 
+        started = time.monotonic()
+        seen = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        rows = created = 0
+        with r_file:
+            for chunk in chunked(
+                    READERS[file_format](r_file),
+                    options['batch_size']
+            ):
+                rows += len(chunk)
+                upload_list = []
+                for name, measurement_unit in chunk:
+                    if (name, measurement_unit) in seen:
+                        continue
+                    seen.add((name, measurement_unit))
+                    upload_list.append(
+                        Ingredient(
+                            name=name,
+                            measurement_unit=measurement_unit,
+                        )
+                    )
                 Ingredient.objects.bulk_create(
-                    upload_list.values(),
+                    upload_list,
                     ignore_conflicts=True,
                 )
-                if len(upload_list) > 0:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Загружено {len(upload_list)} '
-                        f'новых записей в Ingredient.'
-                    ))
-                else:
-                    self.stdout.write(self.style.WARNING(
-                        'Нет новых записей для Ingredient.'
-                    ))
+                created += len(upload_list)
+        elapsed = max(time.monotonic() - started, 1e-6)
+
+        if created > 0:
+            invalidate_ingredient_index()
+            self.stdout.write(self.style.SUCCESS(
+                f'Загружено {created} '
+                f'новых записей в Ingredient.'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'Нет новых записей для Ingredient.'
+            ))
+        self.stdout.write(
+            f'Обработано {rows} строк за {elapsed:.2f} с '
+            f'({rows / elapsed:.0f} строк/с).'
+        )
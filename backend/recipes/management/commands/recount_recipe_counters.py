@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import refresh_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute favorite and cart counters of all recipes.'
+
+    def handle(self, *args, **options):
+        updated = refresh_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счетчики {updated} рецептов.'
+        ))
@@ -0,0 +1,241 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.benchmarks import (
+    BenchmarkCommand, Timings, get_user, test_environment
+)
+from recipes.management.commands.seed_data import USERNAME_PREFIX
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Benchmark the hot API endpoints with the DRF test client and '
+        'write p50/p95 latency and query counts as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Measured requests per endpoint (default: 50).',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Unmeasured requests per endpoint (default: 5).',
+        )
+        parser.add_argument(
+            '--user',
+            help=(
+                'Username to authenticate as '
+                f'(default: the first {USERNAME_PREFIX}* user).'
+            ),
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            metavar='NAME',
+            help='Run only these benchmarks.',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write the JSON results to (default: stdout).',
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='PATH',
+            help='Earlier results to print p50/p95 changes against.',
+        )
+
+    def get_benchmarks(self, user):
+        """(name, authenticated, url, accept) of every benchmark."""
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        search = ingredient.name[:3] if ingredient else 'а'
+        tag_query = '&'.join(f'tags={slug}' for slug in tags)
+        benchmarks = [
+            ('recipes_anonymous', False, '/api/recipes/', None),
+            ('recipes', True, '/api/recipes/', None),
+            ('recipes_limit_50', True, '/api/recipes/?limit=50', None),
+            ('recipes_tags', True, f'/api/recipes/?{tag_query}', None),
+            (
+                'recipes_author',
+                True,
+                f'/api/recipes/?author={user.id}',
+                None,
+            ),
+            (
+                'recipes_is_favorited',
+                True,
+                '/api/recipes/?is_favorited=1',
+                None,
+            ),
+            (
+                'recipes_is_in_shopping_cart',
+                True,
+                '/api/recipes/?is_in_shopping_cart=1',
+                None,
+            ),
+            ('recipes_cursor', True, '/api/recipes/?cursor=', None),
+            (
+                'subscriptions',
+                True,
+                '/api/users/subscriptions/?recipes_limit=3',
+                None,
+            ),
+            (
+                'ingredients_search',
+                True,
+                f'/api/ingredients/?name={search}',
+                None,
+            ),
+            (
+                'download_shopping_cart_txt',
+                True,
+                '/api/recipes/download_shopping_cart/',
+                'text/plain',
+            ),
+            (
+                'download_shopping_cart_pdf',
+                True,
+                '/api/recipes/download_shopping_cart/',
+                'application/pdf',
+            ),
+        ]
+        if recipe is not None:
+            benchmarks.append(
+                ('recipe_detail', True, f'/api/recipes/{recipe.id}/', None)
+            )
+        return benchmarks
+
+    def measure(self, client, url, accept, requests, warmup):
+        headers = {'HTTP_ACCEPT': accept} if accept else {}
+        timings = Timings()
+
+        def get():
+            response = client.get(url, **headers)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return response
+
+        for _ in range(warmup):
+            get()
+        for _ in range(requests):
+            with timings:
+                response = get()
+        return {
+            'url': url,
+            'accept': accept,
+            'status': response.status_code,
+            'requests': requests,
+            **timings.summary(),
+            'max_ms': timings.round(max(timings.values)),
+            'queries': max(timings.queries),
+        }
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['warmup'] < 0:
+            raise CommandError(
+                '--requests must be positive and --warmup not negative.'
+            )
+        user = get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        benchmarks = self.get_benchmarks(user)
+        if options['only']:
+            benchmarks = [
+                benchmark for benchmark in benchmarks
+                if benchmark[0] in options['only']
+            ]
+
+        with test_environment():
+            clients = {False: APIClient(), True: APIClient()}
+            clients[True].credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            results = {}
+            for name, authenticated, url, accept in benchmarks:
+                try:
+                    results[name] = self.measure(
+                        clients[authenticated],
+                        url,
+                        accept,
+                        options['requests'],
+                        options['warmup'],
+                    )
+                except Exception as e:
+                    results[name] = {'url': url, 'error': repr(e)}
+                    self.stderr.write(self.style.ERROR(f'{name}: {e!r}'))
+                    continue
+                self.write_progress(
+                    name,
+                    f'p50 {results[name]["p50_ms"]} мс',
+                    f'p95 {results[name]["p95_ms"]} мс',
+                    f'{results[name]["queries"]} запросов к БД',
+                )
+
+        report = {
+            'meta': {
+                'commit': get_git_commit(),
+                'date': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'user': user.username,
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'results': results,
+        }
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(content + '\n')
+        else:
+            self.stdout.write(content)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def compare(self, path, results):
+        try:
+            with open(path, encoding='utf-8') as file:
+                previous = json.load(file)['results']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        for name, result in results.items():
+            # Benchmarks added since the previous run have no baseline.
+            if (name not in previous
+                    or 'error' in result
+                    or 'error' in previous[name]):
+                continue
+            changes = ', '.join(
+                f'{key} {previous[name][key]} → {result[key]} '
+                f'({(result[key] / previous[name][key] - 1) * 100:+.0f}%)'
+                if previous[name][key] else
+                f'{key} {previous[name][key]} → {result[key]}'
+                for key in ('p50_ms', 'p95_ms', 'queries')
+            )
+            self.stderr.write(f'{name}: {changes}')
@@ -0,0 +1,266 @@
+import io
+import os
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
+
+from recipes.counters import refresh_counters
+from recipes.events import recipes_bulk_written
+from recipes.models import Cart, Ingredient, Recipe, RecipeIngredients, Tag
+from users.models import Follow, User
+
+USERNAME_PREFIX = 'seed_user_'
+DEFAULT_INGREDIENTS_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv'
+)
+DEFAULT_PASSWORD = 'seed-password'
+BATCH_SIZE = 1000
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'омлет', 'каша', 'запеканка',
+    'паста', 'плов', 'котлеты', 'блины', 'соус', 'десерт', 'хлеб',
+)
+
+
+def bulk_create(model, objs):
+    batch_size = min(
+        BATCH_SIZE,
+        connection.ops.bulk_batch_size(model._meta.concrete_fields, objs),
+    )
+    model.objects.bulk_create(objs, batch_size=max(batch_size, 1))
+
+
+def get_placeholder_image():
+    """Name of a shared placeholder photo, stored once."""
+    name = f'{Recipe._meta.get_field("image").upload_to}seed.jpg'
+    if not default_storage.exists(name):
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 400), (230, 180, 120)).save(buffer, 'JPEG')
+        name = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return name
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset for load tests: users, recipes, '
+        'follows, favorites and shopping carts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument(
+            '--follows-per-user',
+            type=int,
+            default=10,
+            help='Authors each user follows.',
+        )
+        parser.add_argument(
+            '--favorites-per-user',
+            type=int,
+            default=20,
+        )
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument(
+            '--ingredients-path',
+            default=DEFAULT_INGREDIENTS_PATH,
+            help=(
+                'Ingredient catalogue imported with import_ingredients '
+                f'(default: {DEFAULT_INGREDIENTS_PATH}).'
+            ),
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed, the same seed gives the same dataset.',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete users created by a previous run first.',
+        )
+
+    def handle(self, *args, **options):
+        for option in (
+                'users', 'recipes_per_user', 'ingredients_per_recipe',
+                'follows_per_user', 'favorites_per_user', 'cart_per_user',
+        ):
+            if options[option] < 0:
+                raise CommandError(
+                    f'--{option.replace("_", "-")} must not be negative.'
+                )
+        seeded = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if seeded.exists():
+            if not options['clear']:
+                raise CommandError('Seed data already exists, use --clear.')
+            seeded.delete()
+
+        call_command(
+            'import_ingredients',
+            path=options['ingredients_path'],
+            stdout=self.stdout,
+        )
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if len(ingredient_ids) < options['ingredients_per_recipe']:
+            raise CommandError('Not enough ingredients in the database.')
+
+        started = time.monotonic()
+        with transaction.atomic():
+            counts = self.seed(
+                random.Random(options['seed']), ingredient_ids, options
+            )
+            refresh_counters()
+            recipes_bulk_written.send(sender=Recipe)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            'Создано: ' + ', '.join(
+                f'{name} {count}' for name, count in counts.items()
+            ) + f' за {elapsed:.1f} с.'
+        ))
+        self.stdout.write(
+            f'Пароль пользователей {USERNAME_PREFIX}*: {DEFAULT_PASSWORD}'
+        )
+
+    def seed(self, rng, ingredient_ids, options):
+        tags = [
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )[0]
+            for name, slug, color in TAGS
+        ]
+        password = make_password(DEFAULT_PASSWORD)
+        bulk_create(
+            User,
+            [
+                User(
+                    username=f'{USERNAME_PREFIX}{index}',
+                    email=f'{USERNAME_PREFIX}{index}@example.com',
+                    first_name=f'Name{index}',
+                    last_name=f'Surname{index}',
+                    password=password,
+                )
+                for index in range(options['users'])
+            ],
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+        image = get_placeholder_image()
+        bulk_create(
+            Recipe,
+            [
+                Recipe(
+                    author_id=user_id,
+                    name=(
+                        f'{rng.choice(WORDS).capitalize()} '
+                        f'{rng.choice(WORDS)} №{index}'
+                    ),
+                    text=' '.join(rng.choices(WORDS, k=rng.randint(20, 80))),
+                    image=image,
+                    cooking_time=rng.randint(5, 120),
+                )
+                for user_id in user_ids
+                for index in range(options['recipes_per_user'])
+            ],
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(author__username__startswith=USERNAME_PREFIX)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+        bulk_create(
+            RecipeIngredients,
+            [
+                RecipeIngredients(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in rng.sample(
+                    ingredient_ids, options['ingredients_per_recipe']
+                )
+            ],
+        )
+        bulk_create(
+            Recipe.tags.through,
+            [
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+                for recipe_id in recipe_ids
+                for tag in rng.sample(tags, rng.randint(1, len(tags)))
+            ],
+        )
+
+        follows = []
+        favorites = []
+        carts = []
+        for user_id in user_ids:
+            authors = [
+                author_id for author_id in rng.sample(
+                    user_ids,
+                    min(options['follows_per_user'] + 1, len(user_ids)),
+                )
+                if author_id != user_id
+            ][:options['follows_per_user']]
+            follows += [
+                Follow(follower_id=user_id, author_id=author_id)
+                for author_id in authors
+            ]
+            favorites += [
+                Recipe.favorite.through(recipe_id=recipe_id, user_id=user_id)
+                for recipe_id in rng.sample(
+                    recipe_ids,
+                    min(options['favorites_per_user'], len(recipe_ids)),
+                )
+            ]
+            carts.append((
+                user_id,
+                rng.sample(
+                    recipe_ids,
+                    min(options['cart_per_user'], len(recipe_ids)),
+                ),
+            ))
+        bulk_create(Follow, follows)
+        bulk_create(Recipe.favorite.through, favorites)
+        bulk_create(Cart, [Cart(user_id=user_id) for user_id, _ in carts])
+        cart_ids = dict(
+            Cart.objects.filter(user__username__startswith=USERNAME_PREFIX)
+            .values_list('user_id', 'id')
+        )
+        bulk_create(
+            Cart.recipes.through,
+            [
+                Cart.recipes.through(cart_id=cart_ids[user_id],
+                                     recipe_id=recipe_id)
+                for user_id, cart_recipe_ids in carts
+                for recipe_id in cart_recipe_ids
+            ],
+        )
+        return {
+            'пользователей': len(user_ids),
+            'рецептов': len(recipe_ids),
+            'подписок': len(follows),
+            'избранных': len(favorites),
+            'корзин': len(carts),
+        }
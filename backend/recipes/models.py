@@ -62,6 +62,18 @@ class Recipe(models.Model):
         'Recipe photo',
         upload_to='recipes_photos/',
     )
+    image_card = models.ImageField(
+        'Recipe card photo',
+        upload_to='recipes_photos/',
+        blank=True,
+        editable=False,
+    )
+    image_thumbnail = models.ImageField(
+        'Recipe photo thumbnail',
+        upload_to='recipes_photos/',
+        blank=True,
+        editable=False,
+    )
     tags = models.ManyToManyField(
         Tag,
         related_name='recipes',
@@ -89,15 +101,35 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Publish date',
     )
+    favorites_count = models.PositiveIntegerField(
+        'Times added to favorites',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Times added to shopping carts',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
     def favorite_count(self):
-        return self.favorite.count()
+        return self.favorites_count
 
 
 class Ingredient(models.Model):
@@ -114,6 +146,12 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
@@ -164,3 +202,36 @@ class Cart(models.Model):
 
     def recipes_in_cart_count(self):
         return self.recipes.count()
+
+
+class ShoppingListJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUSES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    id = models.CharField(
+        'Hash of the owner and the shopping list',
+        max_length=64,
+        primary_key=True,
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name='Job owner',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    status = models.CharField(
+        'Job status',
+        max_length=16,
+        choices=STATUSES,
+        default=STATUS_PENDING,
+    )
+    updated = models.DateTimeField(
+        'Last status change',
+        auto_now=True,
+    )
@@ -0,0 +1,42 @@
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Length
+
+from recipes.models import Ingredient
+
+PREFIX_MATCH = 0
+SUBSTRING_MATCH = 1
+
+
+def search_ingredients(keyword, limit=None):
+    """Find ingredients by name, prefix matches first.
+
+    On PostgreSQL the substring lookup is served by the pg_trgm GIN index
+    on UPPER(name), the expression icontains compiles to, and results are
+    ranked by trigram similarity; other backends fall back to ranking by
+    name length.
+    """
+    queryset = (
+        Ingredient.objects
+        .filter(name__icontains=keyword)
+        .annotate(
+            match=Case(
+                When(name__istartswith=keyword, then=Value(PREFIX_MATCH)),
+                default=Value(SUBSTRING_MATCH),
+                output_field=IntegerField(),
+            )
+        )
+    )
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        queryset = queryset.annotate(
+            similarity=TrigramSimilarity('name', keyword)
+        ).order_by('match', '-similarity', 'name')
+    else:
+        queryset = queryset.annotate(
+            similarity=Length('name')
+        ).order_by('match', 'similarity', 'name')
+    if limit is not None:
+        queryset = queryset[:limit]
+    return queryset
@@ -0,0 +1,36 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.counters import COUNTERS, refresh_counters
+from recipes.index import invalidate_ingredient_index
+from recipes.models import Cart, Ingredient, Recipe
+
+COUNTER_FIELDS = {through: field for field, through in COUNTERS.items()}
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    invalidate_ingredient_index()
+
+
+@receiver(m2m_changed, sender=Recipe.favorite.through)
+@receiver(m2m_changed, sender=Cart.recipes.through)
+def recipe_counters_changed(sender, instance, action, pk_set, **kwargs):
+    fields = [COUNTER_FIELDS[sender]]
+    if isinstance(instance, Recipe):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_counters([instance.id], fields)
+        return
+    if action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            sender.objects.filter(**{
+                f'{instance._meta.model_name}_id': instance.id
+            }).values_list('recipe_id', flat=True)
+        )
+    elif action == 'post_clear':
+        refresh_counters(
+            instance.__dict__.pop('_cleared_recipe_ids', []), fields
+        )
+    elif action in ('post_add', 'post_remove'):
+        refresh_counters(pk_set, fields)
@@ -0,0 +1,145 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from recipes.counters import count_subquery
+from recipes.index import load_ingredient_index
+from recipes.search import search_ingredients
+from recipes.models import Cart, Ingredient, Recipe, Tag
+from users.models import User
+
+
+class IndexTestBase(TestCase):
+    def assert_uses_index(self, queryset, index):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan than to search.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn(index, queryset.explain())
+
+
+class RelationIndexTests(IndexTestBase):
+    """Lookups of the many-to-many tables by their second column."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com',
+            username='user',
+            first_name='Name',
+            last_name='Surname',
+            password='password',
+        )
+        cls.tag = Tag.objects.create(name='Tag', slug='tag', color='#000000')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Recipe',
+            text='Text',
+            image='recipes_photos/recipe.jpg',
+            cooking_time=10,
+        )
+        cls.recipe.tags.add(cls.tag)
+        cls.recipe.favorite.add(cls.user)
+        Cart.objects.create(user=cls.user).recipes.add(cls.recipe)
+
+    def test_recipes_with_tag(self):
+        self.assert_uses_index(
+            Recipe.tags.through.objects.filter(tag_id=self.tag.id),
+            'recipes_recipe_tags_tag_recipe_idx',
+        )
+
+    def test_carts_with_recipe(self):
+        self.assert_uses_index(
+            Recipe.objects.filter(pk=self.recipe.pk).annotate(
+                in_carts=count_subquery(Cart.recipes.through)
+            ),
+            'recipes_cart_recipes_recipe_id',
+        )
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'The trigram index is created on PostgreSQL only.',
+)
+class IngredientSearchIndexTests(IndexTestBase):
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('соль', 'соль морская', 'фасоль', 'сахар')
+        )
+
+    def test_substring_search_uses_trigram_index(self):
+        self.assert_uses_index(
+            search_ingredients('соль'),
+            'recipes_ingredient_name_upper_trgm',
+        )
+
+
+class IngredientIndexStartupTests(TestCase):
+    @override_settings(INGREDIENT_INDEX_ENABLED=True, CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    })
+    def test_warns_about_per_process_cache(self):
+        with self.assertLogs('recipes.index', 'WARNING'):
+            load_ingredient_index()
+
+
+class ImportIngredientsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def import_file(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        stdout = io.StringIO()
+        call_command('import_ingredients', path=path, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_reimport_adds_nothing(self):
+        for name, content in (
+                ('ingredients.csv', 'соль,г\nсахар,г\nсоль,г\n'),
+                ('ingredients.json', (
+                    '[{"name": "соль", "measurement_unit": "г"},'
+                    ' {"name": "мука", "measurement_unit": "г"}]'
+                )),
+        ):
+            with self.subTest(name=name):
+                self.import_file(name, content)
+                count = Ingredient.objects.count()
+                output = self.import_file(name, content)
+                self.assertIn('Нет новых записей', output)
+                self.assertEqual(Ingredient.objects.count(), count)
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list('name', flat=True)),
+            ['мука', 'сахар', 'соль'],
+        )
+
+    def test_malformed_json(self):
+        for content, message in (
+                ('{"name": "соль"}', 'must contain an array'),
+                (
+                    '[{"name": "соль", "measurement_unit": "г"},'
+                    ' {"name": "сахар"}]',
+                    'record 1 must be an object',
+                ),
+                ('[["соль", "г"]]', 'record 0 must be an object'),
+                (
+                    '[{"name": "соль", "measurement_unit": "г"}, {"name"',
+                    'malformed at record 1',
+                ),
+        ):
+            with self.subTest(content=content):
+                with self.assertRaisesMessage(CommandError, message):
+                    self.import_file('ingredients.json', content)